@@ -1,16 +1,20 @@
 # bot.py
 
+import asyncio
 import discord
 from discord.ext import commands
 
 from . import cogs
 from .cogs import utils
-from .cogs.utils.utils import create_emojis
+from .cogs.utils.utils import MapManifest, MemberCache, GuildData, PUGData, sync_emojis, set_language
+from .cogs.utils import metrics
+from .cogs.utils.watchdog import LoopWatchdog
 
 import json
 import sys
 import os
 import logging
+import time
 
 
 _CWD = os.path.dirname(os.path.abspath(__file__))
@@ -20,7 +24,8 @@ INTENTS_JSON = os.path.join(_CWD, 'intents.json')
 class PUGsBot(commands.AutoShardedBot):
     """ Sub-classed AutoShardedBot modified to fit the needs of the application. """
 
-    def __init__(self, prefixes, discord_token, web_url, db_connect_url, league_url):
+    def __init__(self, prefixes, discord_token, web_url, db_connect_url, league_url, low_memory=False,
+                 metrics_port=None, metrics_host='127.0.0.1', watchdog_threshold=None):
         """ Set attributes and configure bot. """
         # Call parent init
         with open(INTENTS_JSON) as f:
@@ -29,14 +34,30 @@ class PUGsBot(commands.AutoShardedBot):
         self.prefixes = prefixes.split()
 
         intents = discord.Intents(**intents_attrs)
-        super().__init__(command_prefix=self.prefixes, case_insensitive=True, intents=intents)
+        options = {}
+
+        if low_memory:
+            # Only cache the members in voice channels, the others are fetched and kept in the member cache when used
+            member_cache_flags = discord.MemberCacheFlags.none()
+            member_cache_flags.voice = True
+            options['member_cache_flags'] = member_cache_flags
+            options['chunk_guilds_at_startup'] = False
+
+        super().__init__(command_prefix=self.prefixes, case_insensitive=True, intents=intents, **options)
 
         # Set argument attributes
         self.discord_token = discord_token
         self.web_url = web_url
         self.db_connect_url = db_connect_url
         self.league_url = league_url
+        self.map_manifest = MapManifest.load()
+        self.emojis_synced = None
+        self.emojis_lock = asyncio.Lock()
+        self.emoji_guild_id = None
+        self.ready_shards = set()
         self.all_maps = {}
+        self.guild_languages = {}
+        self.member_cache = MemberCache(low_memory=low_memory)
 
         # Set constants
         self.colors = {
@@ -54,6 +75,16 @@ class PUGsBot(commands.AutoShardedBot):
         # Create session for API
         self.api = utils.ApiHelper(self, self.loop, self.web_url)
 
+        # Create the server exposing the metrics if a port is set
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = metrics.MetricsServer(self.loop, metrics_host, metrics_port)
+
+        # Measure the event loop lag for the metrics and report the stalls longer than the threshold if one is set
+        self.watchdog = None
+        if metrics_port is not None or watchdog_threshold is not None:
+            self.watchdog = LoopWatchdog(self.loop, watchdog_threshold)
+
         # Initialize set of errors to ignore
         self.ignore_error_types = set()
 
@@ -63,8 +94,9 @@ class PUGsBot(commands.AutoShardedBot):
         self.ignore_error_types.add(commands.errors.MissingPermissions)
         self.ignore_error_types.add(commands.errors.UserInputError)
 
-        # Trigger typing before every command
-        self.before_invoke(commands.Context.trigger_typing)
+        # Answer in the guild's language and trigger typing before every command
+        self.before_invoke(self._before_invoke)
+        self.after_invoke(self._after_invoke)
 
         # Add cogs
         for cog in cogs.__all__:
@@ -85,6 +117,35 @@ class PUGsBot(commands.AutoShardedBot):
         except Exception as e:
             print(e)
 
+    async def _before_invoke(self, ctx):
+        """"""
+        ctx.invoke_start = time.perf_counter()
+        await self.use_guild_language(ctx.guild)
+        await ctx.trigger_typing()
+
+    async def _after_invoke(self, ctx):
+        """"""
+        metrics.COMMAND_SECONDS.observe(time.perf_counter() - ctx.invoke_start, command=ctx.command.qualified_name)
+
+    async def guild_language(self, guild):
+        """ Get the language set for a guild, None meaning the default language. """
+        try:
+            return self.guild_languages[guild.id]
+        except KeyError:
+            pass
+
+        try:
+            guild_data = await self.db.get_guild(guild.id)
+        except AttributeError:
+            return None
+
+        self.guild_languages[guild.id] = guild_data['language']
+        return guild_data['language']
+
+    async def use_guild_language(self, guild):
+        """ Translate the texts of the current task to the language of a guild. """
+        set_language(await self.guild_language(guild))
+
     def embed_template(self, **kwargs):
         """ Implement the bot's default-style embed. """
         try:
@@ -93,35 +154,125 @@ class PUGsBot(commands.AutoShardedBot):
             kwargs['color'] = self.colors['blue']
         return discord.Embed(**kwargs)
 
+    @commands.Cog.listener()
+    async def on_shard_ready(self, shard_id):
+        """ Start serving the guilds of a shard without waiting for the other shards. """
+        guilds = [guild for guild in self.guilds if guild.shard_id == shard_id]
+
+        if guilds:
+            print(f'Synchronize guilds of shard {shard_id}...')
+            await self.db.insert_guilds(*(guild.id for guild in guilds))
+            await self.update_emojis()
+            await self.warm_up(guilds)
+            print(f'Shard {shard_id} is ready now!')
+
+        self.ready_shards.add(shard_id)
+        self.start_loops()
+
     @commands.Cog.listener()
     async def on_ready(self):
-        """ Synchronize the guilds the bot is in with the guilds table. """
+        """ Remove the guilds the bot is no longer in from the guilds table once every shard is ready. """
         if self.guilds:
             print('Synchronize guilds...')
             await self.db.sync_guilds(*(guild.id for guild in self.guilds))
-            print('Creating emojis...')
-            await create_emojis(self, self.guilds[0])
             print('Bot is ready now!')
 
+        self.start_loops()
+
+    def guild_shard(self, guild_id):
+        """ Get the id of the shard a guild belongs to, even if it is served by another instance. """
+        return (guild_id >> 22) % self.shard_count
+
+    async def lead_shards(self, job, shard_ids):
+        """ Lead a job for the ready shards among the given ones and give it up for the other ready shards.
+
+        The job is led per shard, so each instance of a bot split for sharding runs it for the guilds it serves. Get
+        the shards this instance leads the job of, another instance serving the same shards may lead some of them.
+        """
+        led_shards = set()
+
+        for shard_id in self.ready_shards:
+            name = f'{job}:{shard_id}'
+
+            if shard_id not in shard_ids:
+                await self.db.release_leadership(name)
+            elif await self.db.acquire_leadership(name):
+                led_shards.add(shard_id)
+
+        return led_shards
+
+    async def release_shards(self, job):
+        """ Give up a job for every shard. """
+        for shard_id in self.ready_shards:
+            await self.db.release_leadership(f'{job}:{shard_id}')
+
+    def start_loops(self):
+        """"""
         lobby_cog = self.get_cog('LobbyCog')
         match_cog = self.get_cog('MatchCog')
         if not match_cog.check_matches.is_running():
-            self.get_cog('MatchCog').check_matches.start()
+            match_cog.check_matches.start()
         if not lobby_cog.check_unbans.is_running():
-            self.get_cog('LobbyCog').check_unbans.start()
+            lobby_cog.check_unbans.start()
+
+    async def update_emojis(self):
+        """ Synchronize the map emojis with the emoji guild, one synchronization at a time.
+
+        The emoji guild is the first guild synchronized, and is kept as more shards get ready until the bot leaves it.
+        """
+        async with self.emojis_lock:
+            emoji_guild = self.get_guild(self.emoji_guild_id) if self.emoji_guild_id is not None else None
+
+            if emoji_guild is None:
+                emoji_guild = self.guilds[0]
+                self.emoji_guild_id = emoji_guild.id
+
+            await sync_emojis(self, emoji_guild)
+
+    async def warm_up(self, guilds):
+        """ Load the state of guilds with one query per table and index it in memory. """
+        start = time.perf_counter()
+        state = await self.db.get_guilds_state(*(guild.id for guild in guilds))
+        guilds_data = {}
+        pugs_data = {}
+
+        for row in state['guilds']:
+            self.guild_languages[row['id']] = row['language']
+            try:
+                guilds_data[row['id']] = GuildData.from_dict(self, row)
+            except AttributeError:
+                pass
+
+        for row in state['pugs']:
+            try:
+                pugs_data[row['id']] = PUGData.from_dict(self, row)
+            except AttributeError:
+                pass
+
+        self.get_cog('LobbyCog').load_lobbies(pugs_data.values(), state['queued_users'])
+        self.get_cog('MatchCog').load_matches(state['matches'], state['match_users'], guilds_data, pugs_data)
+
+        self.logger.info(f'Loaded {len(guilds_data)} guilds, {len(pugs_data)} PUGs and {len(state["matches"])} '
+                         f'matches in {time.perf_counter() - start:.3f}s')
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
         """ Insert the newly added guild to the guilds table. """
         await self.db.insert_guilds(guild.id)
-        await create_emojis(self, self.guilds[0])
+        await self.update_emojis()
 
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
         """ Delete the recently removed guild from the guilds table. """
         await self.db.delete_guilds(guild.id)
+        self.guild_languages.pop(guild.id, None)
         if self.guilds:
-            await create_emojis(self, self.guilds[0])
+            await self.update_emojis()
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        """ Forget the member in the member cache. """
+        self.member_cache.remove(member)
 
     async def on_guild_channel_delete(self, channel):
         """"""
@@ -153,6 +304,7 @@ class PUGsBot(commands.AutoShardedBot):
                 pass
             try:
                 await self.db.delete_pugs(pug_data['id'])
+                self.get_cog('LobbyCog').remove_lobby(pug_data['id'])
                 print(f"Removed PUG ID #{pug_data['id']} from Discord ({channel.guild.name})")
             except AttributeError:
                 pass
@@ -163,8 +315,24 @@ class PUGsBot(commands.AutoShardedBot):
         """ Override parent run to automatically include Discord token. """
         super().run(self.discord_token)
 
+    async def start(self, *args, **kwargs):
+        """ Override parent start to serve the metrics and watch the event loop before connecting to Discord. """
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+
+        if self.watchdog is not None:
+            self.watchdog.start()
+
+        await super().start(*args, **kwargs)
+
     async def close(self):
-        """ Override parent close to close the API session also. """
+        """ Override parent close to close the API session, the metrics server and the watchdog also. """
         await super().close()
         await self.api.close()
         await self.db.close()
+
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+
+        if self.watchdog is not None:
+            self.watchdog.stop()
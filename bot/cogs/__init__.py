@@ -2,6 +2,7 @@
 
 from .logging import LoggingCog
 from .help import HelpCog
+from .menu import MenuCog
 from .lobby import LobbyCog
 from .match import MatchCog
 from .commands import CommandsCog
@@ -9,6 +10,7 @@ from .commands import CommandsCog
 __all__ = [
     LoggingCog,
     HelpCog,
+    MenuCog,
     LobbyCog,
     MatchCog,
     CommandsCog
@@ -67,6 +67,32 @@ class CommandsCog(commands.Cog):
         embed.set_footer(text=translate('command-setup-footer'))
         await ctx.send(embed=embed)
 
+    @commands.command(usage='language <language|optional>',
+                      brief=translate('command-language-brief'),
+                      aliases=['lang'])
+    @commands.has_permissions(kick_members=True)
+    async def language(self, ctx, language=None):
+        """"""
+        languages = ', '.join(catalog.languages)
+
+        if language is None:
+            curr_language = await self.bot.guild_language(ctx.guild) or catalog.default_language
+            msg = translate('command-language-current', curr_language, languages)
+            raise commands.UserInputError(message=msg)
+
+        language = language.lower()
+
+        if language not in catalog.languages:
+            msg = translate('command-language-invalid', languages)
+            raise commands.UserInputError(message=msg)
+
+        await self.bot.db.update_guild(ctx.guild.id, language=language)
+        self.bot.guild_languages[ctx.guild.id] = language
+        set_language(language)
+
+        embed = self.bot.embed_template(title=translate('command-language-success', language))
+        await ctx.send(embed=embed)
+
     @commands.command(usage='create_server <ip:port> <rcon_password> <server_name|optional> <server_gotv|optional>',
                       brief=translate('command-create_server-brief'))
     @commands.has_permissions(administrator=True)
@@ -250,22 +276,19 @@ class CommandsCog(commands.Cog):
 
         pug_data = await check_pug(self.bot, ctx, queue_id)
         lobby_channel = pug_data.lobby_channel
+        lobby = await self.lobby_cog.get_lobby(pug_data)
 
-        if self.lobby_cog.locked_lobby[pug_data.id]:
+        if lobby.locked:
             msg = translate('command-empty-locked')
             raise commands.UserInputError(message=msg)
 
-        self.lobby_cog.locked_lobby[pug_data.id] = True
-        await self.bot.db.clear_queued_users(pug_data.id)
         msg = translate('command-empty-success')
-        embed = await self.lobby_cog.queue_embed(pug_data, msg)
-        await self.lobby_cog.update_last_msg(pug_data, embed)
+        await lobby.call(self.lobby_cog.clear_queue, msg)
         guild_data = await get_guild_data(self.bot, ctx.guild.id)
 
         for member in lobby_channel.members:
             await member.move_to(guild_data.prematch_channel)
 
-        self.lobby_cog.locked_lobby[pug_data.id] = False
         _embed = self.bot.embed_template(title=msg, color=self.bot.colors['green'])
         await ctx.send(embed=_embed)
 
@@ -294,16 +317,13 @@ class CommandsCog(commands.Cog):
             msg = translate('command-cap-out-range')
             raise commands.UserInputError(message=msg)
 
-        if self.lobby_cog.locked_lobby[pug_data.id]:
+        lobby = await self.lobby_cog.get_lobby(pug_data)
+
+        if lobby.locked:
             msg = translate('command-cap-locked')
             raise commands.UserInputError(message=msg)
 
-        self.lobby_cog.locked_lobby[pug_data.id] = True
-        await self.bot.db.clear_queued_users(pug_data.id)
-        await self.bot.db.update_pug(pug_data.id, capacity=new_cap)
-        embed = await self.lobby_cog.queue_embed(pug_data, translate('command-empty-success'))
-        embed.set_footer(text=translate('command-cap-footer'))
-        await self.lobby_cog.update_last_msg(pug_data, embed)
+        await lobby.call(self.lobby_cog.set_capacity, new_cap)
         msg = translate('command-cap-success', new_cap)
         lobby_channel = pug_data.lobby_channel
         guild_data = await get_guild_data(self.bot, ctx.guild.id)
@@ -314,8 +334,6 @@ class CommandsCog(commands.Cog):
         awaitables.append(lobby_channel.edit(user_limit=new_cap))
         await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
 
-        self.lobby_cog.locked_lobby[pug_data.id] = False
-
         embed = self.bot.embed_template(title=msg)
         await ctx.send(embed=embed)
 
@@ -457,14 +475,14 @@ class CommandsCog(commands.Cog):
 
         pug_data = await check_pug(self.bot, ctx, queue_id)
         curr_spectator_ids = await self.bot.db.get_spect_users(pug_data.id)
-        curr_spectators = [ctx.guild.get_member(spectator_id) for spectator_id in curr_spectator_ids]
         spectators = ctx.message.mentions
 
         if prefix is None:
-            if not curr_spectators:
+            if not curr_spectator_ids:
                 spect_value = 'No spectators'
             else:
-                spect_value = ''.join(f'{num}. {user.mention}\n' for num, user in enumerate(curr_spectators, start=1))
+                spect_value = ''.join(
+                    f'{num}. <@{user_id}>\n' for num, user_id in enumerate(curr_spectator_ids, start=1))
 
             embed = self.bot.embed_template()
             embed.add_field(name='__Spectators__', value=spect_value)
@@ -481,7 +499,11 @@ class CommandsCog(commands.Cog):
             msg = translate('invalid-usage', self.bot.command_prefix[0], ctx.command.usage)
             raise commands.UserInputError(message=msg)
 
-        await self.bot.db.delete_queued_users(pug_data.id, [spectator.id for spectator in spectators])
+        if prefix == '+':
+            # Spectators can't play, the lobby worker keeps its queue and the database in step
+            lobby = await self.lobby_cog.get_lobby(pug_data)
+            await lobby.call(self.lobby_cog.remove_queued, spectators)
+
         for spectator in spectators:
             if prefix == '+':
                 if spectator.id in curr_spectator_ids:
@@ -529,16 +551,24 @@ class CommandsCog(commands.Cog):
         embed = self.bot.embed_template(title=title)
         await ctx.send(embed=embed)
 
-    @commands.command(brief=translate('command-stats-brief'),
+    @commands.command(usage='stats <user mention|optional> ...',
+                      brief=translate('command-stats-brief'),
                       aliases=['rank'])
     async def stats(self, ctx):
         """"""
-        user_data = await get_user_data(self.bot, ctx.guild, ctx.author.id)
+        users = ctx.message.mentions or [ctx.author]
+
+        if len(users) > 1:
+            await self.compare_stats(ctx, users)
+            return
+
+        user = users[0]
+        user_data = await get_user_data(self.bot, ctx.guild, user.id)
         if not user_data:
-            msg = f'Unable to get {ctx.author.display_name}\'s stats: Account not linked'
+            msg = f'Unable to get {user.display_name}\'s stats: Account not linked'
             raise commands.UserInputError(message=msg)
 
-        stats = await self.bot.api.player_stats(user_data)
+        stats = await get_player_stats(self.bot, user_data)
         description = '```ml\n' \
                      f' {translate("command-stats-kills")}:             {stats.kills} \n' \
                      f' {translate("command-stats-deaths")}:            {stats.deaths} \n' \
@@ -553,21 +583,69 @@ class CommandsCog(commands.Cog):
                      f' {translate("command-stats-rating")}:    {stats.average_rating} \n' \
                       '```'
         embed = self.bot.embed_template(description=description)
-        embed.set_author(name=ctx.author.display_name, url=stats.profile,
-                            icon_url=ctx.author.avatar_url_as(size=128))
+        embed.set_author(name=user.display_name, url=stats.profile,
+                            icon_url=user.avatar_url_as(size=128))
         await ctx.send(embed=embed)
 
-    @commands.command(brief=translate('command-leaders-brief'),
+    async def compare_stats(self, ctx, users):
+        """ Send the stats of multiple users side by side. """
+        users_stats = await get_players_stats(self.bot, users) or []
+        linked_ids = {stats.discord for stats in users_stats}
+        unlinked = ', '.join(user.display_name for user in users if user.id not in linked_ids)
+
+        if not users_stats:
+            raise commands.UserInputError(message=translate('command-stats-not-linked', unlinked))
+
+        linked_users = [user for user in users if user.id in linked_ids]
+
+        # Generate comparison text
+        data = [['Player'] + [user.display_name for user in linked_users],
+                ['Rating'] + [str(stats.average_rating) for stats in users_stats],
+                ['K/D'] + [stats.kdr for stats in users_stats],
+                ['HS'] + [stats.hsp for stats in users_stats],
+                ['Winrate'] + [stats.win_percent for stats in users_stats],
+                ['Played'] + [str(stats.total_maps) for stats in users_stats]]
+        data[0] = [name if len(name) < 12 else name[:9] + '...' for name in data[0]]  # Shorten long names
+        widths = list(map(lambda x: len(max(x, key=len)), data))
+        aligns = ['left', 'right', 'right', 'right', 'right', 'right']
+        z = zip(data, widths, aligns)
+        formatted_data = [list(map(lambda x: align_text(x, width, align), col)) for col, width, align in z]
+        formatted_data = list(map(list, zip(*formatted_data)))  # Transpose list for .format() string
+
+        description = '```ml\n'
+
+        for player_row in formatted_data:
+            description += ' {}  {}  {}  {}  {}  {} \n'.format(*player_row)
+
+        description += '```'
+        embed = self.bot.embed_template(description=description)
+
+        if unlinked:
+            embed.set_footer(text=translate('command-stats-not-linked', unlinked))
+
+        await ctx.send(embed=embed)
+
+    @commands.command(usage='leaders <page|optional>',
+                      brief=translate('command-leaders-brief'),
                       aliases=['top', 'ranks'])
-    async def leaders(self, ctx):
+    async def leaders(self, ctx, page: int = 1):
         """"""
-        num = 10
-        guild_players = await self.bot.api.leaderboard(ctx.guild.members)
-        guild_players.sort(key=lambda u: (u.average_rating), reverse=True)
-        guild_players = guild_players[:num]
+        per_page = 10
+        guild_players, pages = await get_guild_leaders(self.bot, ctx.guild, page, per_page)
+
+        if not guild_players:
+            msg = translate('command-leaders-empty') if page == 1 else translate('command-leaders-invalid-page', pages)
+            raise commands.UserInputError(message=msg)
+
+        ranks = [rank for rank, _ in guild_players]
+        guild_players = [player for _, player in guild_players]
+        # Players who are not linked anymore have no Discord id
+        linked_ids = [player.discord for player in guild_players if player.discord is not None]
+        members = dict(zip(linked_ids, await self.bot.member_cache.get_members(ctx.guild, linked_ids)))
 
         # Generate leaderboard text
-        data = [['Player'] + [ctx.guild.get_member(player.discord).display_name for player in guild_players],
+        data = [['Player'] + [members[player.discord].display_name if members.get(player.discord) else player.name
+                              for player in guild_players],
                 ['Rating'] + [str(player.average_rating) for player in guild_players],
                 ['Winrate'] + [player.win_percent for player in guild_players],
                 ['Played'] + [str(player.total_maps) for player in guild_players]]
@@ -577,17 +655,19 @@ class CommandsCog(commands.Cog):
         z = zip(data, widths, aligns)
         formatted_data = [list(map(lambda x: align_text(x, width, align), col)) for col, width, align in z]
         formatted_data = list(map(list, zip(*formatted_data)))  # Transpose list for .format() string
+        rank_width = len(str(ranks[-1]))
 
-        description = '```ml\n    {}  {}  {}  {} \n'.format(*formatted_data[0])
+        description = '```ml\n{}   {}  {}  {}  {} \n'.format(' ' * rank_width, *formatted_data[0])
 
-        for rank, player_row in enumerate(formatted_data[1:], start=1):
-            description += ' {}. {}  {}  {}  {} \n'.format(rank, *player_row)
+        for rank, player_row in zip(ranks, formatted_data[1:]):
+            description += ' {}. {}  {}  {}  {} \n'.format(str(rank).rjust(rank_width), *player_row)
 
         description += '```'
 
         # Send leaderboard
         title = f'__{translate("command-leaders-leaderboard")}__'
         embed = self.bot.embed_template(title=title, description=description)
+        embed.set_footer(text=translate('command-leaders-page', page, pages))
         await ctx.send(embed=embed)
 
     @commands.command(usage='ban <user mention> ... [<days>d] [<hours>h] [<minutes>m]',
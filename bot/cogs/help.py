@@ -34,6 +34,9 @@ class HelpCog(commands.Cog):
     async def on_command_error(self, ctx, error):
         """ Send help message when a mis-entered command is received. """
         if type(error) is commands.CommandNotFound:
+            if ctx.guild is not None:
+                await self.bot.use_guild_language(ctx.guild)
+
             # Get Levenshtein distance from commands
             in_cmd = ctx.invoked_with
             bot_cmds = list(self.bot.commands)
@@ -2,22 +2,155 @@
 
 from discord.ext import commands, tasks
 from discord.errors import NotFound, HTTPException
-from discord.utils import get
-from collections import defaultdict
 from datetime import datetime, timezone
+from collections import deque, defaultdict
 import asyncio
 
 from .message import ReadyMessage
+from .utils import metrics
 from .utils.utils import *
 
 
+RENDER_DELAY = 1.5
+TITLE_LOG_SIZE = 5
+
+
+class Lobby:
+    """ Serialized event queue of a single PUG lobby holding its queue state in memory. """
+
+    def __init__(self, bot, pug_data, queued_ids):
+        """ Set attributes and start the worker task. """
+        self.bot = bot
+        self.pug_data = pug_data
+        self.queued_ids = queued_ids
+        self.locked = False
+        self.titles = deque(maxlen=TITLE_LOG_SIZE)
+        self.footer = None
+        self.render = Debouncer(self.bot.loop, RENDER_DELAY, self._render)
+        self.events = asyncio.Queue()
+        self.worker = self.bot.loop.create_task(self._process_events())
+
+    async def _process_events(self):
+        """ Handle the lobby events one at a time in the order they were submitted. """
+        while True:
+            func, args, future = await self.events.get()
+
+            try:
+                await self.bot.use_guild_language(self.pug_data.guild)
+                result = await func(self, *args)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The caller may have stopped waiting for the result
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                else:
+                    self.bot.get_cog('LoggingCog').log_exception(
+                        f'Uncaught exception in queue of PUG ID #{self.pug_data.id}:', e)
+            else:
+                if future is not None and not future.done():
+                    future.set_result(result)
+
+    def submit(self, func, *args):
+        """ Queue an event handler without waiting for it to run. """
+        self.events.put_nowait((func, args, None))
+
+    async def call(self, func, *args):
+        """ Queue an event handler and wait for its result. """
+        future = self.bot.loop.create_future()
+        self.events.put_nowait((func, args, future))
+        return await future
+
+    def log(self, title, footer=None):
+        """ Record a queue event and schedule a render of the queue message. """
+        self.titles.append(title)
+        self.footer = footer
+        self.render.schedule()
+
+    async def _render(self):
+        """ Update the queue message from the current state of the lobby. """
+        lobby_cog = self.bot.get_cog('LobbyCog')
+        embed = await lobby_cog.queue_embed(self.pug_data, self.titles[-1], self.queued_ids)
+
+        if len(self.titles) > 1:
+            embed.add_field(name=translate('lobby-recent-events'), value='\n'.join(list(self.titles)[-2::-1]))
+
+        if self.footer:
+            embed.set_footer(text=self.footer)
+
+        await lobby_cog.update_last_msg(self.pug_data, embed)
+
+    def close(self):
+        """ Stop the worker task. """
+        self.render.close()
+        self.worker.cancel()
+
+
 class LobbyCog(commands.Cog):
     """"""
     def __init__(self, bot):
         """"""
         self.bot = bot
-        self.locked_lobby = {}
-        self.locked_lobby = defaultdict(lambda: False, self.locked_lobby)
+        self.lobbies = {}
+        self.lobby_channels = {}
+        metrics.LOBBIES.set_function(lambda: len(self.lobbies))
+        metrics.QUEUED_PLAYERS.set_function(lambda: sum(len(lobby.queued_ids) for lobby in self.lobbies.values()))
+        metrics.LOBBY_PENDING_EVENTS.set_function(lambda: sum(lobby.events.qsize() for lobby in self.lobbies.values()))
+
+    def cog_unload(self):
+        """ Stop the lobby workers. """
+        for lobby in self.lobbies.values():
+            lobby.close()
+
+    async def get_lobby(self, pug_data):
+        """ Get the lobby of a PUG, loading its queue from the database the first time. """
+        lobby = self.lobbies.get(pug_data.id)
+
+        if lobby is None:
+            queued_ids = await self.bot.db.get_queued_users(pug_data.id)
+            lobby = self.lobbies.get(pug_data.id)
+
+            if lobby is None:
+                lobby = Lobby(self.bot, pug_data, queued_ids)
+                self.lobbies[pug_data.id] = lobby
+                self.lobby_channels[pug_data.lobby_channel.id] = pug_data.id
+
+        return lobby
+
+    def load_lobbies(self, pugs, queued_users):
+        """ Create the lobbies of PUGs with their queues from already loaded rows. """
+        queued_ids = defaultdict(list)
+
+        for row in queued_users:
+            queued_ids[row['pug_id']].append(row['user_id'])
+
+        for pug_data in pugs:
+            if pug_data.id in self.lobbies or pug_data.lobby_channel is None:
+                continue
+
+            self.lobbies[pug_data.id] = Lobby(self.bot, pug_data, queued_ids[pug_data.id])
+            self.lobby_channels[pug_data.lobby_channel.id] = pug_data.id
+
+    async def get_channel_lobby(self, channel):
+        """ Get the lobby a voice channel belongs to if any. """
+        try:
+            return self.lobbies[self.lobby_channels[channel.id]]
+        except KeyError:
+            pass
+
+        pug_data = await get_pug_data(self.bot, channel.id, 'lobby_channel')
+        if pug_data is None or channel != pug_data.lobby_channel:
+            return None
+
+        return await self.get_lobby(pug_data)
+
+    def remove_lobby(self, pug_id):
+        """ Forget a deleted PUG and stop its worker. """
+        lobby = self.lobbies.pop(pug_id, None)
+
+        if lobby is not None:
+            self.lobby_channels.pop(lobby.pug_data.lobby_channel.id, None)
+            lobby.close()
 
     async def queue_embed(self, pug_data, title=None, queued_ids=None):
         """"""
@@ -30,9 +163,7 @@ class LobbyCog(commands.Cog):
         if len(queued_ids) == 0:
             queue_str = translate('lobby-is-empty')
         else:
-            queued_users = [pug_data.guild.get_member(user_id) for user_id in queued_ids]
-            queue_str = ''.join(
-                f'{num}. {user.mention}\n' for num, user in enumerate(queued_users, start=1))
+            queue_str = ''.join(f'{num}. <@{user_id}>\n' for num, user_id in enumerate(queued_ids, start=1))
 
         embed = self.bot.embed_template(title=title, description=queue_str)
         embed.set_footer(text=translate('lobby-footer'))
@@ -40,12 +171,16 @@ class LobbyCog(commands.Cog):
 
     async def update_last_msg(self, pug_data, embed):
         """"""
-        try:
-            msg = await pug_data.last_message.fetch()
-            await msg.edit(embed=embed)
-        except (NotFound, HTTPException):
-            msg = await pug_data.queue_channel.send(embed=embed)
-            await self.bot.db.update_pug(pug_data.id, last_message=msg.id)
+        if pug_data.last_message is not None:
+            try:
+                await pug_data.last_message.edit(embed=embed)
+                return
+            except NotFound:
+                pass
+
+        msg = await pug_data.queue_channel.send(embed=embed)
+        pug_data.last_message = msg
+        await self.bot.db.update_pug(pug_data.id, last_message=msg.id)
 
     async def check_ready(self, message, users, guild_data):
         """"""
@@ -53,6 +188,31 @@ class LobbyCog(commands.Cog):
         ready_users = await menu.ready_up()
         return ready_users
 
+    async def clear_queue(self, lobby, title, footer=None):
+        """ Remove every user from the queue of a lobby. """
+        lobby.queued_ids.clear()
+        await self.bot.db.clear_queued_users(lobby.pug_data.id)
+        lobby.log(title, footer)
+
+    async def remove_queued(self, lobby, users):
+        """ Remove users from the queue of a lobby, the users who are not queued are ignored. """
+        removed = [user for user in users if user.id in lobby.queued_ids]
+
+        if not removed:
+            return
+
+        for user in removed:
+            lobby.queued_ids.remove(user.id)
+            lobby.log(translate('lobby-user-removed', user.display_name))
+
+        await self.bot.db.delete_queued_users(lobby.pug_data.id, *(user.id for user in removed))
+
+    async def set_capacity(self, lobby, capacity):
+        """ Change the capacity of a lobby and empty its queue. """
+        await self.bot.db.update_pug(lobby.pug_data.id, capacity=capacity)
+        lobby.pug_data.capacity = capacity
+        await self.clear_queue(lobby, translate('command-empty-success'), translate('command-cap-footer'))
+
     @commands.Cog.listener()
     async def on_voice_state_update(self, user, before, after):
         """"""
@@ -60,150 +220,187 @@ class LobbyCog(commands.Cog):
             return
 
         if before.channel is not None:
-            before_pug_data = await get_pug_data(self.bot, before.channel.id, 'lobby_channel')
-            if before_pug_data is not None and before.channel == before_pug_data.lobby_channel:
-                if not self.locked_lobby[before_pug_data.id]:
-                    removed = await self.bot.db.delete_queued_users(before_pug_data.id, user.id)
-
-                    if user.id in removed:
-                        title = translate('lobby-user-removed', user.display_name)
-                    else:
-                        title = translate('lobby-user-not-in-lobby', user.display_name)
-
-                    embed = await self.queue_embed(before_pug_data, title)
-                    await self.update_last_msg(before_pug_data, embed)
+            before_lobby = await self.get_channel_lobby(before.channel)
+            if before_lobby is not None:
+                before_lobby.submit(self._leave, user)
 
         if after.channel is not None:
-            after_pug_data = await get_pug_data(self.bot, after.channel.id, 'lobby_channel')
-            if after_pug_data is not None and after.channel == after_pug_data.lobby_channel:
-                if not self.locked_lobby[after_pug_data.id]:
-                    awaitables = []
-                    for pug_id in await self.bot.db.get_guild_pugs(after.channel.guild.id):
-                        if pug_id != after_pug_data.id:
-                            awaitables.append(self.bot.db.get_queued_users(pug_id))
-                    others_queued_ids = await asyncio.gather(*awaitables, loop=self.bot.loop)
-                    others_queued_ids = sum(others_queued_ids, [])
-
-                    awaitables = [
-                        get_user_data(self.bot, user.guild, user.id),
-                        self.bot.db.get_queued_users(after_pug_data.id),
-                        self.bot.db.get_spect_users(after_pug_data.id),
-                        self.bot.db.get_banned_users(after.channel.guild.id),
-                        self.bot.db.get_all_matches_users()
-                    ]
-                    results = await asyncio.gather(*awaitables, loop=self.bot.loop)
-                    is_linked = results[0]
-                    queued_ids = results[1]
-                    spect_ids = results[2]
-                    banned_users = results[3]
-                    matches_users = results[4]
-
-                    if not is_linked:
-                        title = translate('lobby-user-not-linked', user.display_name)
-                    elif user.id in banned_users:
-                        title = translate('lobby-user-is-banned', user.display_name)
-                        unban_time = banned_users[user.id]
-                        if unban_time is not None:
-                            title += f' for {timedelta_str(unban_time - datetime.now(timezone.utc))}'
-                    elif user.id in queued_ids:
-                        title = translate('lobby-user-in-lobby', user.display_name)
-                    elif user.id in matches_users:
-                        title = translate('lobby-user-in-match', user.display_name)
-                    elif user.id in others_queued_ids:
-                        title = translate('lobby-user-in-another-lobby', user.display_name)
-                    elif user.id in spect_ids:
-                        title = translate('lobby-user-in-spectators', user.display_name)
-                    elif len(queued_ids) >= after_pug_data.capacity:
-                        title = translate('lobby-is-full', user.display_name)
-                    else:
-                        await self.bot.db.insert_queued_users(after_pug_data.id, user.id)
-                        queued_ids += [user.id]
-                        title = translate('lobby-user-added', user.display_name)
-
-                        if len(queued_ids) == after_pug_data.capacity:
-                            self.locked_lobby[after_pug_data.id] = True
-
-                            match_cog = self.bot.get_cog('MatchCog')
-                            guild_data = await get_guild_data(self.bot, after.channel.guild.id)
-                            linked_role = guild_data.linked_role
-                            prematch_channel = guild_data.prematch_channel
-                            queue_channel = after_pug_data.queue_channel
-                            queued_users = [user.guild.get_member(user_id) for user_id in queued_ids]
-
-                            await after.channel.set_permissions(linked_role, connect=False)
-
-                            try:
-                                queue_msg = await after_pug_data.last_message.fetch()
-                                await queue_msg.delete()
-                            except (NotFound, HTTPException):
-                                pass
-
-                            ready_msg = await queue_channel.send(''.join([user.mention for user in queued_users]))
-                            ready_users = await self.check_ready(ready_msg, queued_users, guild_data)
-                            await asyncio.sleep(1)
-                            unreadied = set(queued_users) - ready_users
-
-                            if unreadied:
-                                description = ''.join(f':x: {user.mention}\n' for user in unreadied)
-                                title = translate('lobby-not-all-ready')
-                                burst_embed = self.bot.embed_template(title=title, description=description,
-                                                                      color=self.bot.colors['red'])
-                                burst_embed.set_footer(text=translate('lobby-unready-footer'))
-
-                                awaitables = [
-                                    ready_msg.clear_reactions(),
-                                    ready_msg.edit(content='', embed=burst_embed),
-                                    self.bot.db.delete_queued_users(after_pug_data.id,
-                                                                    *(user.id for user in unreadied))
-                                ]
-
-                                for user in queued_users:
-                                    awaitables.append(user.add_roles(linked_role))
-                                for user in unreadied:
-                                    awaitables.append(user.move_to(prematch_channel))
-                                await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
-                            else:
-                                await ready_msg.clear_reactions()
-                                new_match = await match_cog.start_match(queued_users, ready_msg, after_pug_data,
-                                                                        guild_data)
-                                if new_match:
-                                    await self.bot.db.clear_queued_users(after_pug_data.id)
-                                else:
-                                    awaitables = [self.bot.db.clear_queued_users(after_pug_data.id)]
-                                    for user in queued_users:
-                                        awaitables.append(user.add_roles(linked_role))
-                                    for user in queued_users:
-                                        awaitables.append(user.move_to(prematch_channel))
-                                    await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
-
-                            title = translate('lobby-players-in-lobby')
-                            embed = await self.queue_embed(after_pug_data, title)
-                            await self.update_last_msg(after_pug_data, embed)
-
-                            self.locked_lobby[after_pug_data.id] = False
-                            await after_pug_data.lobby_channel.set_permissions(linked_role, connect=True)
-                            return
-
-                    embed = await self.queue_embed(after_pug_data, title)
-                    await self.update_last_msg(after_pug_data, embed)
+            after_lobby = await self.get_channel_lobby(after.channel)
+            if after_lobby is not None:
+                after_lobby.submit(self._join, user)
+
+    async def _leave(self, lobby, user):
+        """ Remove a user who left the lobby channel from the queue. """
+        pug_data = lobby.pug_data
+
+        if user.id in lobby.queued_ids:
+            lobby.queued_ids.remove(user.id)
+            await self.bot.db.delete_queued_users(pug_data.id, user.id)
+            title = translate('lobby-user-removed', user.display_name)
+        else:
+            title = translate('lobby-user-not-in-lobby', user.display_name)
+
+        lobby.log(title)
+
+    async def _join(self, lobby, user):
+        """ Add a user who joined the lobby channel to the queue and start the match once it fills up. """
+        pug_data = lobby.pug_data
+        guild = pug_data.guild
+        queued_ids = lobby.queued_ids
+
+        others_queued_ids = []
+        awaitables = []
+        for pug_id in await self.bot.db.get_guild_pugs(guild.id):
+            if pug_id == pug_data.id:
+                continue
+
+            if pug_id in self.lobbies:
+                others_queued_ids += self.lobbies[pug_id].queued_ids
+            else:
+                awaitables.append(self.bot.db.get_queued_users(pug_id))
+        for pug_queued_ids in await asyncio.gather(*awaitables, loop=self.bot.loop):
+            others_queued_ids += pug_queued_ids
+
+        awaitables = [
+            get_user_data(self.bot, guild, user.id),
+            self.bot.db.get_spect_users(pug_data.id),
+            self.bot.db.get_banned_users(guild.id),
+            self.bot.db.get_all_matches_users()
+        ]
+        results = await asyncio.gather(*awaitables, loop=self.bot.loop)
+        is_linked = results[0]
+        spect_ids = results[1]
+        banned_users = results[2]
+        matches_users = results[3]
+
+        if not is_linked:
+            title = translate('lobby-user-not-linked', user.display_name)
+        elif user.id in banned_users:
+            title = translate('lobby-user-is-banned', user.display_name)
+            unban_time = banned_users[user.id]
+            if unban_time is not None:
+                title += f' for {timedelta_str(unban_time - datetime.now(timezone.utc))}'
+        elif user.id in queued_ids:
+            title = translate('lobby-user-in-lobby', user.display_name)
+        elif user.id in matches_users:
+            title = translate('lobby-user-in-match', user.display_name)
+        elif user.id in others_queued_ids:
+            title = translate('lobby-user-in-another-lobby', user.display_name)
+        elif user.id in spect_ids:
+            title = translate('lobby-user-in-spectators', user.display_name)
+        elif len(queued_ids) >= pug_data.capacity:
+            title = translate('lobby-is-full', user.display_name)
+        else:
+            await self.bot.db.insert_queued_users(pug_data.id, user.id)
+            queued_ids.append(user.id)
+            title = translate('lobby-user-added', user.display_name)
+
+            if len(queued_ids) == pug_data.capacity:
+                lobby.locked = True
+                try:
+                    await self._start_match(lobby)
+                finally:
+                    lobby.locked = False
+                return
+
+        lobby.log(title)
+
+    async def _start_match(self, lobby):
+        """ Ready up the users of a full lobby and start their match. """
+        match_cog = self.bot.get_cog('MatchCog')
+        guild = lobby.pug_data.guild
+        guild_data = await get_guild_data(self.bot, guild.id)
+        pug_data = await get_pug_data(self.bot, lobby.pug_data.id)
+        lobby.pug_data = pug_data
+        linked_role = guild_data.linked_role
+        prematch_channel = guild_data.prematch_channel
+        queue_channel = pug_data.queue_channel
+        queued_users = await self.bot.member_cache.get_members(guild, lobby.queued_ids)
+
+        await pug_data.lobby_channel.set_permissions(linked_role, connect=False)
+
+        lobby.render.cancel()
+        await lobby.render.flush()
+
+        try:
+            await pug_data.last_message.delete()
+        except (AttributeError, NotFound, HTTPException):
+            pass
+        pug_data.last_message = None
+
+        ready_msg = await queue_channel.send(''.join([user.mention for user in queued_users]))
+        ready_users = await self.check_ready(ready_msg, queued_users, guild_data)
+        await asyncio.sleep(1)
+        unreadied = set(queued_users) - ready_users
+
+        if unreadied:
+            description = ''.join(f':x: {user.mention}\n' for user in unreadied)
+            title = translate('lobby-not-all-ready')
+            burst_embed = self.bot.embed_template(title=title, description=description,
+                                                  color=self.bot.colors['red'])
+            burst_embed.set_footer(text=translate('lobby-unready-footer'))
+
+            for user in unreadied:
+                lobby.queued_ids.remove(user.id)
+
+            awaitables = [
+                ready_msg.clear_reactions(),
+                ready_msg.edit(content='', embed=burst_embed),
+                self.bot.db.delete_queued_users(pug_data.id, *(user.id for user in unreadied))
+            ]
+
+            for user in queued_users:
+                awaitables.append(user.add_roles(linked_role))
+            for user in unreadied:
+                awaitables.append(user.move_to(prematch_channel))
+            await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
+        else:
+            await ready_msg.clear_reactions()
+            new_match = await match_cog.start_match(queued_users, ready_msg, pug_data, guild_data)
+            lobby.queued_ids.clear()
+            if new_match:
+                await self.bot.db.clear_queued_users(pug_data.id)
+            else:
+                awaitables = [self.bot.db.clear_queued_users(pug_data.id)]
+                for user in queued_users:
+                    awaitables.append(user.add_roles(linked_role))
+                for user in queued_users:
+                    awaitables.append(user.move_to(prematch_channel))
+                await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
+
+        lobby.titles.clear()
+        lobby.log(translate('lobby-players-in-lobby'))
+
+        await pug_data.lobby_channel.set_permissions(linked_role, connect=True)
 
     @tasks.loop(seconds=30.0)
     async def check_unbans(self):
-        there_banned_users = False
-        unbanned_users = {}
+        banned_guilds = []
         for guild in self.bot.guilds:
-            guild_data = await get_guild_data(self.bot, guild.id)
-            guild_bans = await self.bot.db.get_banned_users(guild.id)
+            if guild.shard_id in self.bot.ready_shards and await self.bot.db.get_banned_users(guild.id):
+                banned_guilds.append(guild)
+
+        if not banned_guilds:
+            self.check_unbans.cancel()
+            return
+
+        led_shards = await self.bot.lead_shards('check_unbans', {guild.shard_id for guild in banned_guilds})
 
-            if guild_bans:
-                there_banned_users = True
-                guild_unbanned_users = await self.bot.db.get_unbanned_users(guild.id)
-                unbanned_users[guild] = guild_unbanned_users
+        for guild in banned_guilds:
+            if guild.shard_id not in led_shards:
+                continue
 
-                for user_ids in unbanned_users[guild]:
-                    users = [get(guild.members, id=user_id) for user_id in user_ids]
-                    for user in users:
+            guild_data = await get_guild_data(self.bot, guild.id)
+            guild_unbanned_users = await self.bot.db.get_unbanned_users(guild.id)
+
+            for user in await self.bot.member_cache.get_members(guild, guild_unbanned_users):
+                if user is not None:
+                    try:
                         await user.add_roles(guild_data.linked_role)
+                    except HTTPException:  # The user left the guild or the role is gone
+                        pass
 
-        if not there_banned_users:
-            self.check_unbans.cancel()
+    @check_unbans.after_loop
+    async def release_check_unbans(self):
+        """ Let another instance take over the unbans once the loop stops, even if it crashed. """
+        await self.bot.release_shards('check_unbans')
@@ -1,12 +1,21 @@
 # logging.py
 
 import __main__
+import atexit
+import copy
 import discord
 from discord.ext import commands
+import json
 import logging
-from logging import config
-from os import path
-import traceback
+from logging import config, handlers
+from os import environ, path
+import queue
+import time
+
+
+LOG_FORMAT = environ.get('DISCORD_BOT_LOG_FORMAT', 'text').lower()
+REPEATED_LOG_INTERVAL = 60  # Seconds during which a repeated error is only counted
+REPEATED_LOG_KEYS = 1000  # Number of distinct errors remembered
 
 
 LOGGING_CONFIG = {
@@ -46,6 +55,9 @@ LOGGING_CONFIG = {
         },
         'discord.gateway': {
             'level': 'WARNING'
+        },
+        'discord.http': {
+            'level': 'WARNING'
         }
     },
     'root': {
@@ -57,13 +69,107 @@ LOGGING_CONFIG = {
     }
 }
 
-config.dictConfig(LOGGING_CONFIG)
 
+class JsonFormatter(logging.Formatter):
+    """ Format records as compact JSON lines. """
 
-def indent(string, n=4):
-    """"""
-    indent = ' ' * n
-    return indent + string.replace('\n', '\n' + indent)
+    def format(self, record):
+        """"""
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage()
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class RepeatedErrorFilter(logging.Filter):
+    """ Let the first of identical errors through and only count the repeats for an interval.
+
+    The next identical error after the interval is logged with the number of repeats that were dropped.
+    """
+
+    def __init__(self, interval=REPEATED_LOG_INTERVAL, max_keys=REPEATED_LOG_KEYS):
+        """"""
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self.seen = {}
+
+    def filter(self, record):
+        """"""
+        if record.levelno < logging.ERROR:
+            return True
+
+        exc = record.exc_info[1] if record.exc_info else None
+        key = (record.name, record.getMessage(), type(exc), str(exc))
+        now = time.monotonic()
+        seen = self.seen.get(key)
+
+        if seen is not None and now - seen[0] < self.interval:
+            seen[1] += 1
+            return False
+
+        if seen is not None and seen[1]:
+            record.msg = f'{record.getMessage()}\n(Repeated {seen[1]} times in the last {now - seen[0]:.0f}s)'
+            record.args = None
+
+        if len(self.seen) >= self.max_keys:
+            self.seen = {k: v for k, v in self.seen.items() if now - v[0] < self.interval}
+
+        self.seen[key] = [now, 0]
+        return True
+
+
+class QueueHandler(handlers.QueueHandler):
+    """ Queue handler keeping the formatted exception apart from the message for the JSON formatter. """
+
+    def prepare(self, record):
+        """"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+def start_queue_listener():
+    """ Move the handlers of the root logger to a background thread fed through a queue. """
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RepeatedErrorFilter())
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    root.addHandler(queue_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+if LOG_FORMAT == 'json':
+    LOGGING_CONFIG['formatters']['json'] = {'()': JsonFormatter}
+
+    for handler_config in LOGGING_CONFIG['handlers'].values():
+        handler_config['formatter'] = 'json'
+
+config.dictConfig(LOGGING_CONFIG)
+listener = start_queue_listener()
 
 
 def log_lines(lvl, msg, *args, sub_lines=None, **kwargs):
@@ -91,11 +197,8 @@ class LoggingCog(commands.Cog):
         self.log_exception(f'Uncaught exception in "{ctx.command}" command:', error)
 
     def log_exception(self, msg, error):
-        """"""
-        msg += '\n\n'
-        exc_lines = traceback.format_exception(type(error), error, error.__traceback__)
-        exc = ''.join(exc_lines)
-        self.logger.error(msg + indent(exc))
+        """ Log an error with its traceback kept apart from the message, for the JSON format and repeat counting. """
+        self.logger.error(msg, exc_info=(type(error), error, error.__traceback__))
 
     @commands.Cog.listener()
     async def on_connect(self):
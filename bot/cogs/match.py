@@ -2,17 +2,19 @@
 
 import asyncio
 from discord.ext import commands, tasks
+from discord import PartialMessage
 from discord.utils import get
-from discord.errors import NotFound
+from discord.errors import NotFound, HTTPException
 
 from .message import TeamDraftMessage, MapVetoMessage, MapVoteMessage
 from .utils.utils import *
+from .utils.api import stats_rows
+from .utils import metrics
 
+from collections import defaultdict
 from random import shuffle, choice
-from traceback import print_exception
-from datetime import datetime
+from datetime import datetime, timezone
 import time
-import sys
 
 
 class MatchCog(commands.Cog):
@@ -20,13 +22,33 @@ class MatchCog(commands.Cog):
     def __init__(self, bot):
         """"""
         self.bot = bot
+        self.matches = {}
+
+    def load_matches(self, matches, match_users, guilds, pugs):
+        """ Keep the matches built from already loaded rows for the next check of the matches. """
+        player_ids = defaultdict(list)
+
+        for row in match_users:
+            player_ids[row['match_id']].append(row['user_id'])
+
+        for row in matches:
+            guild_data = guilds.get(row['guild'])
+            pug_data = pugs.get(row['pug'])
+
+            if guild_data is None or pug_data is None:
+                continue
+
+            message = None
+            if row['message'] is not None and pug_data.queue_channel is not None:
+                message = pug_data.queue_channel.get_partial_message(row['message'])
+
+            self.matches[row['id']] = MatchData.from_rows(row, guild_data, pug_data, player_ids[row['id']], message)
 
     async def autobalance_teams(self, users):
-        """ Balance teams based on players' avarage raitng. """
-        # Get players and sort by average rating
-        users_dict = dict(zip(await self.bot.api.leaderboard(users), users))
-        players = list(users_dict.keys())
-        players.sort(key=lambda x: x.average_rating)
+        """ Balance teams based on players' recent form, or their average rating if they have no recent maps. """
+        # Get players sorted by form rating, worst first
+        players = await rank_users_by_form(self.bot, users)
+        players.reverse()
 
         # Balance teams
         team_size = len(players) // 2
@@ -38,12 +60,12 @@ class MatchCog(commands.Cog):
                 team_two.append(players.pop())
             elif len(team_two) >= team_size:
                 team_one.append(players.pop())
-            elif sum(p.average_rating for p in team_one) < sum(p.average_rating for p in team_two):
+            elif sum(form for _, form in team_one) < sum(form for _, form in team_two):
                 team_one.append(players.pop())
             else:
                 team_two.append(players.pop())
 
-        return list(map(users_dict.get, team_one)), list(map(users_dict.get, team_two))
+        return [user for user, _ in team_one], [user for user, _ in team_two]
 
     async def draft_teams(self, message, users, pug_data):
         """"""
@@ -85,14 +107,13 @@ class MatchCog(commands.Cog):
 
         for team in [team_one, team_two]:
             team_name = f'__Team {team[0].display_name}__'
-            team_players = '\n'.join(f'{num}. {user.mention}' for num, user in enumerate(team, start=1))
-            embed.add_field(name=team_name, value=team_players)
-
-        embed.add_field(
-            name=translate('match-spectators'),
-            value=translate('match-no-spectators') if not spectators
-            else ''.join(f'{num}. {user.mention}\n' for num, user in enumerate(spectators, start=1))
-        )
+            add_fields(embed, team_name, [f'{num}. {user.mention}\n' for num, user in enumerate(team, start=1)])
+
+        if spectators:
+            add_fields(embed, translate('match-spectators'),
+                       [f'{num}. {user.mention}\n' for num, user in enumerate(spectators, start=1)])
+        else:
+            embed.add_field(name=translate('match-spectators'), value=translate('match-no-spectators'))
         embed.set_footer(text=translate('match-server-message-footer'))
         return embed
 
@@ -122,7 +143,7 @@ class MatchCog(commands.Cog):
         await message.edit(content='', embed=burst_embed)
 
         spect_ids = await self.bot.db.get_spect_users(pug_data.id)
-        spectators = [guild_data.guild.get_member(user_id) for user_id in spect_ids]
+        spectators = await self.bot.member_cache.get_members(guild_data.guild, spect_ids)
 
         try:
             match = await self.bot.api.create_match(team_one, team_two, spectators, map_pick[0], guild_data.auth)
@@ -132,10 +153,11 @@ class MatchCog(commands.Cog):
                                                   description=description,
                                                   color=self.bot.colors['red'])
             await message.edit(embed=burst_embed)
-            print_exception(type(e), e, e.__traceback__, file=sys.stderr)
+            self.bot.get_cog('LoggingCog').log_exception('Failed to create a match on G5API:', e)
             return False
 
         await self.bot.db.insert_matches(match.id)
+        metrics.MATCHES_STARTED.inc()
 
         burst_embed = await self._embed_server(match, team_one, team_two, spectators, map_pick)
         await message.edit(embed=burst_embed)
@@ -149,20 +171,32 @@ class MatchCog(commands.Cog):
 
     @tasks.loop(seconds=20.0)
     async def check_matches(self):
-        match_ids = await self.bot.db.get_all_matches()
-        if match_ids:
-            for match_id in match_ids:
-                match = await get_match_data(self.bot, match_id)
+        matches = await self.bot.db.get_all_matches()
+        if matches:
+            match_shards = {match_id: self.bot.guild_shard(guild_id) for match_id, guild_id in matches.items()}
+            led_shards = await self.bot.lead_shards('check_matches', set(match_shards.values()))
+
+            for match_id, shard_id in match_shards.items():
+                if shard_id not in led_shards:  # Matches of shards not ready or led by another instance
+                    continue
+                match = self.matches.pop(match_id, None) or await get_match_data(self.bot, match_id)
+                await self.bot.use_guild_language(match.guild_data.guild)
                 try:
                     api_matches = await self.bot.api.matches_status(match.guild_data.auth)
                 except Exception as e:
-                    print_exception(type(e), e, e.__traceback__, file=sys.stderr)
+                    self.bot.get_cog('LoggingCog').log_exception(
+                        f'Failed to get the status of the matches of guild "{match.guild_data.guild.id}":', e)
                     continue
                 if match_id in api_matches:
                     await self.update_match(match_id, match, api_matches[match_id])
         else:
             self.check_matches.cancel()
 
+    @check_matches.after_loop
+    async def release_check_matches(self):
+        """ Let another instance take over the matches once the loop stops, even if it crashed. """
+        await self.bot.release_shards('check_matches')
+
     async def update_match(self, match_id, match, live):
         """"""
         scoreboard = await self.bot.api.get_match_scoreboard(match_id)
@@ -219,8 +253,11 @@ class MatchCog(commands.Cog):
             match_score = f'{translate("match-id", match_id)}  Team {team1_name}  [{map_stats["team1_score"]}:{map_stats["team2_score"]}]  Team {team2_name}'
         else:
             try:
-                match_score = match.message.embeds[0].author.name
-            except NotFound:
+                message = match.message
+                if isinstance(message, PartialMessage):  # Matches loaded on startup only keep a handle to it
+                    message = await message.fetch()
+                match_score = message.embeds[0].author.name
+            except (AttributeError, IndexError, HTTPException):
                 match_score = 'message deleted!'
 
         # Send scoreboard
@@ -236,6 +273,13 @@ class MatchCog(commands.Cog):
             pass
         
         if not live:
+            # Matches cancelled with the end command also end, but without a winner, and don't count in the stats
+            if match_info and not match_info.get('cancelled') and match_info.get('winner') is not None:
+                players = scoreboard['team1_players'] + scoreboard['team2_players']
+                rows = stats_rows(match_id, match_info['winner'], players, datetime.now(timezone.utc))
+                await self.bot.db.insert_match_stats(match.guild_data.guild.id, rows)
+                metrics.MATCHES_FINISHED.inc()
+
             await self.remove_teams_channels(match)
 
     async def create_teams_channels(self, match_id, team_one, team_two, pug_data, guild_data, message):
@@ -294,13 +338,13 @@ class MatchCog(commands.Cog):
     async def remove_teams_channels(self, match):
         """"""
         guild = match.guild_data.guild
-        banned_users = await self.bot.db.get_banned_users(guild.id)
-        banned_users = [guild.get_member(user_id) for user_id in banned_users]
+        banned_ids = await self.bot.db.get_banned_users(guild.id)
+        players = await self.bot.member_cache.get_members(guild, match.player_ids)
 
         awaitables = []
-        for user in match.players:
+        for user in players:
             if user is not None:
-                if user not in banned_users:
+                if user.id not in banned_ids:
                     awaitables.append(user.add_roles(match.guild_data.linked_role))
                 awaitables.append(user.move_to(match.guild_data.prematch_channel))
         await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
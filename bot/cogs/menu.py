@@ -0,0 +1,49 @@
+# menu.py
+
+from discord.ext import commands
+from collections import Counter
+import time
+
+from .utils import metrics
+
+
+class MenuCog(commands.Cog):
+    """ Routes reactions to the interactive menu waiting on the reacted message. """
+
+    def __init__(self, bot):
+        """ Set attributes. """
+        self.bot = bot
+        self.handlers = {}
+        self.opened_menus = Counter()
+        metrics.ACTIVE_MENUS.set_function(lambda: {(menu,): count for menu, count in self.active_menus.items()})
+        metrics.OPENED_MENUS.set_function(lambda: {(menu,): count for menu, count in self.opened_menus.items()})
+
+    @staticmethod
+    def _menu_type(handler):
+        """ Get the name of the menu class a reaction handler is bound to. """
+        return type(getattr(handler, '__self__', handler)).__name__
+
+    @property
+    def active_menus(self):
+        """ Count the menus currently waiting for reactions by menu type. """
+        return Counter(self._menu_type(handler) for handler in self.handlers.values())
+
+    def register(self, message_id, handler):
+        """ Send the reactions added to a message to a handler. """
+        self.handlers[message_id] = handler
+        self.opened_menus[self._menu_type(handler)] += 1
+
+    def unregister(self, message_id):
+        """ Stop sending the reactions added to a message to its handler. """
+        self.handlers.pop(message_id, None)
+
+    @commands.Cog.listener()
+    async def on_reaction_add(self, reaction, user):
+        """ Dispatch a reaction to the handler of its message. """
+        handler = self.handlers.get(reaction.message.id)
+
+        if handler is not None:
+            start = time.perf_counter()
+            await self.bot.use_guild_language(reaction.message.guild)
+            await handler(reaction, user)
+            metrics.MENU_REACTION_SECONDS.observe(time.perf_counter() - start, menu=self._menu_type(handler))
@@ -2,9 +2,13 @@
 
 import asyncio
 import discord
+import os
+import time
 from random import shuffle, choice
 
 from .utils.utils import *
+from .utils.draft import DraftEngine
+from .utils import metrics
 
 
 EMOJI_NUMBERS = [u'\u0030\u20E3',
@@ -19,43 +23,136 @@ EMOJI_NUMBERS = [u'\u0030\u20E3',
                  u'\u0039\u20E3',
                  u'\U0001F51F']
 
+PAGE_SIZE = len(EMOJI_NUMBERS) - 1
+PAGE_PREVIOUS = '◀️'
+PAGE_NEXT = '▶️'
 
-class ReadyMessage(discord.Message):
-    def __init__(self, message, bot, users, guild_data):
+MENU_EDIT_INTERVAL = float(os.environ.get('DISCORD_BOT_MENU_EDIT_INTERVAL', 1.0))
+
+
+def vote_count(votes):
+    """ Get the number emoji of a vote count, falling back to plain text past the last number emoji. """
+    return EMOJI_NUMBERS[votes] if votes < len(EMOJI_NUMBERS) else f'**{votes}**'
+
+
+class Menu:
+    """ Base of the interactive menus, wrapping the message they are displayed on. """
+    __slots__ = ('message', 'bot', 'future')
+
+    def __init__(self, message, bot):
+        """ Keep a lightweight handle to the message instead of its whole state. """
+        self.message = message.channel.get_partial_message(message.id)
+        self.bot = bot
+        self.future = None
+
+    @property
+    def id(self):
+        """"""
+        return self.message.id
+
+    async def edit(self, **fields):
+        """"""
+        return await self.message.edit(**fields)
+
+    async def add_reaction(self, emoji):
+        """"""
+        await self.message.add_reaction(emoji)
+
+    async def remove_reaction(self, emoji, member):
+        """"""
+        await self.message.remove_reaction(emoji, member)
+
+    async def clear_reaction(self, emoji):
+        """"""
+        await self.message.clear_reaction(emoji)
+
+    async def clear_reactions(self):
         """"""
-        for attr_name in message.__slots__:
+        await self.message.clear_reactions()
+
+    def _make_editor(self, build_embed):
+        """ Get a debouncer coalescing the edits of the menu embed requested within MENU_EDIT_INTERVAL. """
+        async def edit_embed():
+            await self.edit(embed=build_embed())
+
+        return Debouncer(self.bot.loop, MENU_EDIT_INTERVAL, edit_embed)
+
+    def _is_seedable(self, emoji):
+        """ Check if a reaction still needs to be added while seeding the menu. """
+        return True
+
+    async def _seed_reactions(self, emojis):
+        """ Add reactions in order, the requests go one at a time through the message's rate limit bucket anyway. """
+        for emoji in emojis:
+            if self._is_seedable(emoji):
+                try:
+                    await self.add_reaction(emoji)
+                except discord.HTTPException:
+                    pass
+
+    def _finish(self):
+        """ Stop waiting for reactions. """
+        if self.future is not None:
             try:
-                attr_val = getattr(message, attr_name)
-            except AttributeError:
-                continue
+                self.future.set_result(None)
+            except asyncio.InvalidStateError:
+                pass
 
-            setattr(self, attr_name, attr_val)
+    async def _wait_for_reactions(self, handler, timeout, emojis=()):
+        """ Send the reactions added to the menu to a handler until the menu finishes or times out.
 
-        self.bot = bot
+        The given emojis are seeded in the background, so the menu takes input as soon as the first one lands.
+        """
+        self.future = self.bot.loop.create_future()
+        menu_cog = self.bot.get_cog('MenuCog')
+        menu_cog.register(self.id, handler)
+        seeding = self.bot.loop.create_task(self._seed_reactions(emojis))
+        start = time.perf_counter()
+        outcome = 'cancelled'
+
+        try:
+            await asyncio.wait_for(self.future, timeout)
+            outcome = 'finished'
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            raise
+        finally:
+            metrics.MENU_SECONDS.observe(time.perf_counter() - start, menu=type(self).__name__, outcome=outcome)
+            menu_cog.unregister(self.id)
+            seeding.cancel()
+            await asyncio.gather(seeding, loop=self.bot.loop, return_exceptions=True)
+
+
+class ReadyMessage(Menu):
+    """"""
+    __slots__ = ('users', 'guild_data', 'reactors', 'editor')
+
+    def __init__(self, message, bot, users, guild_data):
+        """"""
+        super().__init__(message, bot)
         self.users = users
         self.guild_data = guild_data
         self.reactors = None
-        self.future = None
+        self.editor = None
 
-    def _ready_embed(self):
+    def _embed(self):
         """"""
-        str_value = ''
+        lines = ['-------------------\n']
         description = translate('message-react-ready', '✅')
         embed = self.bot.embed_template(title=translate('message-lobby-filled-up'), description=description)
 
         for num, user in enumerate(self.users, start=1):
             if user not in self.reactors:
-                str_value += f':heavy_multiplication_x:  {num}. {user.mention}\n '
+                lines.append(f':heavy_multiplication_x:  {num}. {user.mention}\n ')
             else:
-                str_value += f'✅  {num}. {user.mention}\n '
+                lines.append(f'✅  {num}. {user.mention}\n ')
 
-        embed.add_field(name=f":hourglass: __{translate('message-player')}__",
-                        value='-------------------\n' + str_value)
+        add_fields(embed, f":hourglass: __{translate('message-player')}__", lines)
         return embed
 
     async def _process_ready(self, reaction, user):
         """"""
-        if reaction.message.id != self.id or user == self.author:
+        if user == self.bot.user:
             return
 
         if user not in self.users or reaction.emoji != '✅':
@@ -63,270 +160,203 @@ class ReadyMessage(discord.Message):
             return
 
         self.reactors.add(user)
-        await self.edit(embed=self._ready_embed())
+        self.editor.schedule()
 
         if self.reactors.issuperset(self.users):
-            if self.future is not None:
-                try:
-                    self.future.set_result(None)
-                except asyncio.InvalidStateError:
-                    pass
+            self._finish()
 
     async def ready_up(self):
         """"""
         self.reactors = set()
-        self.future = self.bot.loop.create_future()
-        await self.edit(embed=self._ready_embed())
-        await self.add_reaction('✅')
-
-        self.bot.add_listener(self._process_ready, name='on_reaction_add')
+        self.editor = self._make_editor(self._embed)
+        await self.edit(embed=self._embed())
 
-        awaitables = []
-        for user in self.users:
-            awaitables.append(user.remove_roles(self.guild_data.linked_role))
-        await asyncio.gather(*awaitables, loop=self.bot.loop, return_exceptions=True)
+        # Remove the roles while the menu already takes reactions, so an early ready up is not missed
+        removals = [user.remove_roles(self.guild_data.linked_role) for user in self.users]
+        removing = asyncio.gather(*removals, loop=self.bot.loop, return_exceptions=True)
 
         try:
-            await asyncio.wait_for(self.future, 60)
+            await self._wait_for_reactions(self._process_ready, 60, ['✅'])
         except asyncio.TimeoutError:
             pass
 
-        self.bot.remove_listener(self._process_ready, name='on_reaction_add')
+        await removing
+        await self.editor.flush()
 
         return self.reactors
 
 
-class TeamDraftMessage(discord.Message):
+class TeamDraftMessage(Menu):
     """"""
+    __slots__ = ('users', 'pug_data', 'pick_emojis', 'engine', 'page', 'pages', 'title')
+
     def __init__(self, message, bot, users, pug_data):
         """"""
-        for attr_name in message.__slots__:
-            try:
-                attr_val = getattr(message, attr_name)
-            except AttributeError:
-                continue
-
-            setattr(self, attr_name, attr_val)
-
-        self.bot = bot
+        super().__init__(message, bot)
         self.users = users
         self.pug_data = pug_data
-        self.pick_emojis = dict(zip(EMOJI_NUMBERS[1:], users))
-        self.pick_order = '1' + '2211'*20
-        self.pick_number = None
-        self.users_left = None
-        self.teams = None
-        self.captains_emojis = None
-        self.future = None
+        self.engine = DraftEngine(users)
+        self.page = 0
         self.title = None
+        self.pages = (len(users) + PAGE_SIZE - 1) // PAGE_SIZE
+        # Emojis map to a position on the visible page, the engine slot is page * PAGE_SIZE + position
+        self.pick_emojis = {emoji: pos for pos, emoji in enumerate(EMOJI_NUMBERS[1:min(len(users), PAGE_SIZE) + 1])}
 
-    @property
-    def _active_picker(self):
-        """"""
-        if self.pick_number is None:
-            return None
-
-        picking_team_number = int(self.pick_order[self.pick_number])
-        picking_team = self.teams[picking_team_number - 1]
-
-        if len(picking_team) == 0:
-            return None
+        if self.pages > 1:
+            self.pick_emojis[PAGE_PREVIOUS] = None
+            self.pick_emojis[PAGE_NEXT] = None
 
-        return picking_team[0]
+    def _team_field(self, embed, team, budget):
+        """"""
+        if len(team) == 0:
+            embed.add_field(name=f'__{translate("match-team")}__', value=translate("message-team-empty"))
+        else:
+            add_fields(embed, f'__{translate("match-team", team[0].display_name)}__',
+                       [f'{p.display_name}\n' for p in team], budget=budget)
 
     def _picker_embed(self, title):
         """"""
+        self.title = title
         embed = self.bot.embed_template(title=title)
         embed.set_footer(text=translate('message-team-pick-footer'))
 
-        for team in self.teams:
-            team_name = f'__{translate("match-team")}__' if len(
-                team) == 0 else f'__{translate("match-team", team[0].display_name)}__'
-
-            if len(team) == 0:
-                team_players = translate("message-team-empty")
-            else:
-                team_players = '\n'.join(p.display_name for p in team)
-
-            embed.add_field(name=team_name, value=team_players)
+        users_left = []
+        first_slot = self.page * PAGE_SIZE
 
-        users_left_str = ''
-
-        for index, (emoji, user) in enumerate(self.pick_emojis.items()):
-            if not any(user in team for team in self.teams):
-                users_left_str += f'{emoji}  {user.mention}\n'
+        for slot in range(first_slot, min(first_slot + PAGE_SIZE, len(self.engine.players))):
+            user = self.engine.players[slot]
+            if slot in self.engine.remaining:
+                users_left.append(f'{EMOJI_NUMBERS[slot - first_slot + 1]}  {user.mention}\n')
             else:
-                users_left_str += f':heavy_multiplication_x:  ~~{user.mention}~~\n'
+                users_left.append(f':heavy_multiplication_x:  ~~{user.mention}~~\n')
 
-        embed.insert_field_at(1, name=translate("message-players-left"), value=users_left_str)
+        players_left_name = translate("message-players-left")
+        if self.pages > 1:
+            players_left_name += f' ({self.page + 1}/{self.pages})'
 
+        captain_1, captain_2 = self.engine.captains
+        active_picker = self.engine.active_picker
         status_str = ''
 
-        status_str += f'{translate("message-capt1", self.teams[0][0].mention)}\n' if len(
-            self.teams[0]) else f'{translate("message-capt1")}\n '
+        status_str += f'{translate("message-capt1", captain_1.mention)}\n' if captain_1 is not None \
+            else f'{translate("message-capt1")}\n '
 
-        status_str += f'{translate("message-capt2", self.teams[1][0].mention)}\n\n' if len(
-            self.teams[1]) else f'{translate("message-capt2")}\n\n '
+        status_str += f'{translate("message-capt2", captain_2.mention)}\n\n' if captain_2 is not None \
+            else f'{translate("message-capt2")}\n\n '
 
-        status_str += translate("message-current-capt", self._active_picker.mention) \
-            if self._active_picker is not None else translate("message-current-capt")
+        status_str += translate("message-current-capt", active_picker.mention) \
+            if active_picker is not None else translate("message-current-capt")
 
-        embed.add_field(name=translate("message-info"), value=status_str)
+        users_left = ''.join(users_left)
+        info_name = translate("message-info")
+        # Large lobbies can outgrow the embed length limit, the teams share what the other fields leave of it
+        team_budget = (EMBED_LIMIT - len(embed) - len(players_left_name) - len(users_left)
+                       - len(info_name) - len(status_str)) // 2
+
+        self._team_field(embed, self.engine.teams[0], team_budget)
+        embed.add_field(name=players_left_name, value=users_left)
+        self._team_field(embed, self.engine.teams[1], team_budget)
+        embed.add_field(name=info_name, value=status_str)
         return embed
 
-    def _pick_player(self, picker, pickee):
+    def _is_seedable(self, emoji):
         """"""
-        if picker == pickee:
-            return False
-        elif not self.teams[0]:
-            picking_team = self.teams[0]
-            self.captains_emojis.append(list(self.pick_emojis.keys())[list(self.pick_emojis.values()).index(picker)])
-            self.users_left.remove(picker)
-            picking_team.append(picker)
-        elif self.teams[1] == [] and picker == self.teams[0][0]:
-            return False
-        elif self.teams[1] == [] and picker in self.teams[0]:
-            return False
-        elif not self.teams[1]:
-            picking_team = self.teams[1]
-            self.captains_emojis.append(list(self.pick_emojis.keys())[list(self.pick_emojis.values()).index(picker)])
-            self.users_left.remove(picker)
-            picking_team.append(picker)
-        elif picker == self.teams[0][0]:
-            picking_team = self.teams[0]
-        elif picker == self.teams[1][0]:
-            picking_team = self.teams[1]
-        else:
-            return False
-
-        if picker != self._active_picker:
-            return False
-
-        if len(picking_team) > len(self.users) // 2:
-            return False
+        # Emojis are reused across pages, so they are only cleared once picked when everyone fits on one page
+        return self.pages > 1 or self.pick_emojis[emoji] in self.engine.remaining
 
-        self.users_left.remove(pickee)
-        picking_team.append(pickee)
-        self.pick_number += 1
-        return True
+    async def _turn_page(self, reaction, user):
+        """"""
+        step = 1 if str(reaction.emoji) == PAGE_NEXT else -1
+        self.page = (self.page + step) % self.pages
+        await self.remove_reaction(reaction, user)
+        await self.edit(embed=self._picker_embed(self.title))
 
     async def _process_pick(self, reaction, user):
         """"""
-        if reaction.message.id != self.id or user == self.author:
+        if user == self.bot.user:
             return
 
-        pick = self.pick_emojis.get(str(reaction.emoji), None)
+        emoji = str(reaction.emoji)
 
-        if pick is None or pick not in self.users_left or user not in self.users:
+        if emoji not in self.pick_emojis or user not in self.engine.slots:
             await self.remove_reaction(reaction, user)
             return
 
-        if not self._pick_player(user, pick):
-            await self.remove_reaction(reaction, user)
+        if self.pick_emojis[emoji] is None:
+            await self._turn_page(reaction, user)
             return
 
-        await self.clear_reaction(reaction.emoji)
-        title = translate('message-team-picked', user.display_name, pick.display_name)
-
-        if len(self.users) - len(self.users_left) == 2:
-            await self.clear_reaction(self.captains_emojis[0])
-        elif len(self.users) - len(self.users_left) == 4:
-            await self.clear_reaction(self.captains_emojis[1])
+        slot = self.page * PAGE_SIZE + self.pick_emojis[emoji]
 
-        if len(self.users_left) == 1:
-            fat_kid_team = self.teams[0] if len(self.teams[0]) <= len(self.teams[1]) else self.teams[1]
-            fat_kid_team.append(self.users_left.pop(0))
-            await self.edit(embed=self._picker_embed(title))
-            if self.future is not None:
-                try:
-                    self.future.set_result(None)
-                except asyncio.InvalidStateError:
-                    pass
+        if slot not in self.engine.remaining:
+            await self.remove_reaction(reaction, user)
             return
 
-        if len(self.users_left) == 0:
-            await self.edit(embed=self._picker_embed(title))
-            if self.future is not None:
-                try:
-                    self.future.set_result(None)
-                except asyncio.InvalidStateError:
-                    pass
+        volunteered = self.engine.is_remaining(user)
+        pick = self.engine.players[slot]
+
+        if not self.engine.pick(user, pick):
+            await self.remove_reaction(reaction, user)
             return
 
+        title = translate('message-team-picked', user.display_name, pick.display_name)
+
+        if self.pages > 1:
+            await self.remove_reaction(reaction, user)
+        else:
+            await self.clear_reaction(reaction.emoji)
+
+            if volunteered:
+                await self.clear_reaction(EMOJI_NUMBERS[self.engine.slots[user] + 1])
+
         await self.edit(embed=self._picker_embed(title))
 
+        if self.engine.done:
+            self._finish()
+
     async def draft(self):
         """"""
-        self.users_left = self.users.copy()
-        self.teams = [[], []]
-        self.pick_number = 0
-        self.captains_emojis = []
         captain_method = self.pug_data.captain_method
 
         if captain_method == 'rank':
-            users_dict = dict(zip(await self.bot.api.leaderboard(self.users_left), self.users_left))
-            players = list(users_dict.keys())
-            players.sort(key=lambda x: x.average_rating)
-
-            for team in self.teams:
-                player = [players.pop()]
-                captain = list(map(users_dict.get, player))
-                self.users_left.remove(captain[0])
-                team.append(captain[0])
-                captain_emoji_index = list(self.pick_emojis.values()).index(captain[0])
-                self.captains_emojis.append(list(self.pick_emojis.keys())[captain_emoji_index])
+            players = await rank_users_by_form(self.bot, self.users)
+
+            for team in range(len(self.engine.teams)):
+                self.engine.set_captain(team, players[team][0])
         elif captain_method == 'random':
-            temp_users = self.users_left.copy()
+            temp_users = self.users.copy()
             shuffle(temp_users)
 
-            for team in self.teams:
-                captain = temp_users.pop()
-                self.users_left.remove(captain)
-                team.append(captain)
-                captain_emoji_index = list(self.pick_emojis.values()).index(captain)
-                self.captains_emojis.append(list(self.pick_emojis.keys())[captain_emoji_index])
+            for team in range(len(self.engine.teams)):
+                self.engine.set_captain(team, temp_users.pop())
         else:  # captain_method is volunteer
             pass
 
         await self.edit(embed=self._picker_embed(translate('message-team-draft-begun')))
 
-        if self.users_left:
-            for emoji, user in self.pick_emojis.items():
-                if user in self.users_left:
-                    await self.add_reaction(emoji)
-
-            self.future = self.bot.loop.create_future()
-            self.bot.add_listener(self._process_pick, name='on_reaction_add')
+        if not self.engine.done:
             try:
-                await asyncio.wait_for(self.future, 180)
+                await self._wait_for_reactions(self._process_pick, 180, self.pick_emojis)
             except asyncio.TimeoutError:
-                self.bot.remove_listener(self._process_pick, name='on_reaction_add')
                 await self.clear_reactions()
                 raise
 
         await self.clear_reactions()
-        return self.teams
+        return self.engine.teams
 
 
-class MapVetoMessage(discord.Message):
+class MapVetoMessage(Menu):
     """"""
+    __slots__ = ('ban_order', 'captains', 'map_pool', 'maps_left', 'ban_number')
+
     def __init__(self, message, bot):
         """"""
-        for attr_name in message.__slots__:
-            try:
-                attr_val = getattr(message, attr_name)
-            except AttributeError:
-                continue
-
-            setattr(self, attr_name, attr_val)
-
-        self.bot = bot
+        super().__init__(message, bot)
         self.ban_order = '12' * 20
         self.captains = None
         self.map_pool = None
         self.maps_left = None
         self.ban_number = None
-        self.future = None
 
     @property
     def _active_picker(self):
@@ -359,9 +389,13 @@ class MapVetoMessage(discord.Message):
         embed.add_field(name=translate("message-info"), value=status_str)
         return embed
 
+    def _is_seedable(self, emoji):
+        """"""
+        return emoji in self.maps_left
+
     async def _process_ban(self, reaction, user):
         """"""
-        if reaction.message.id != self.id or user == self.author:
+        if user == self.bot.user:
             return
 
         if user not in self.captains or str(reaction) not in [m for m in self.maps_left] or user != self._active_picker:
@@ -379,11 +413,7 @@ class MapVetoMessage(discord.Message):
         await self.edit(embed=embed)
 
         if len(self.maps_left) == 1:
-            if self.future is not None:
-                try:
-                    self.future.set_result(None)
-                except asyncio.InvalidStateError:
-                    pass
+            self._finish()
 
     async def veto(self, pool, captain_1, captain_2):
         """"""
@@ -397,15 +427,9 @@ class MapVetoMessage(discord.Message):
 
         await self.edit(embed=self._veto_embed(translate('message-map-bans-begun')))
 
-        for m in self.map_pool:
-            await self.add_reaction(m.emoji)
-
-        self.future = self.bot.loop.create_future()
-        self.bot.add_listener(self._process_ban, name='on_reaction_add')
         try:
-            await asyncio.wait_for(self.future, 180)
+            await self._wait_for_reactions(self._process_ban, 180, [m.emoji for m in self.map_pool])
         except asyncio.TimeoutError:
-            self.bot.remove_listener(self._process_ban, name='on_reaction_add')
             await self.clear_reactions()
             raise
 
@@ -413,32 +437,26 @@ class MapVetoMessage(discord.Message):
         return list(self.maps_left.values())
 
 
-class MapVoteMessage(discord.Message):
+class MapVoteMessage(Menu):
     """"""
+    __slots__ = ('users', 'voted_users', 'map_pool', 'map_votes', 'tie_count', 'editor')
+
     def __init__(self, message, bot, users):
         """"""
-        for attr_name in message.__slots__:
-            try:
-                attr_val = getattr(message, attr_name)
-            except AttributeError:
-                continue
-
-            setattr(self, attr_name, attr_val)
-
-        self.bot = bot
+        super().__init__(message, bot)
         self.users = users
         self.voted_users = None
         self.map_pool = None
         self.map_votes = None
-        self.future = None
         self.tie_count = 0
+        self.editor = None
 
-    def _vote_embed(self):
+    def _embed(self):
         embed = self.bot.embed_template(title=translate('message-vote-map-started'))
         str_value = '--------------------\n'
         max_map = max(self.map_votes.values())
         str_value += '\n'.join(
-            f'{EMOJI_NUMBERS[self.map_votes[m.emoji]]} {m.emoji} {m.name} '
+            f'{vote_count(self.map_votes[m.emoji])} {m.emoji} {m.name} '
             f'{"🔸" if self.map_votes[m.emoji] == max_map and self.map_votes[m.emoji] != 0 else ""} '
             for m in self.map_pool)
         embed.add_field(name=f':repeat_one: :map: {translate("message-maps")}', value=str_value)
@@ -447,7 +465,7 @@ class MapVoteMessage(discord.Message):
 
     async def _process_vote(self, reaction, user):
         """"""
-        if reaction.message.id != self.id or user == self.author:
+        if user == self.bot.user:
             return
 
         if user not in self.users or user in self.voted_users or str(reaction) not in [m.emoji for m in self.map_pool]:
@@ -456,34 +474,26 @@ class MapVoteMessage(discord.Message):
 
         self.map_votes[str(reaction)] += 1
         self.voted_users[user] = str(reaction)
-        await self.edit(embed=self._vote_embed())
+        self.editor.schedule()
 
         if len(self.voted_users) == len(self.users):
-            if self.future is not None:
-                try:
-                    self.future.set_result(None)
-                except asyncio.InvalidStateError:
-                    pass
+            self._finish()
 
     async def vote(self, mpool):
         """"""
         self.voted_users = {}
         self.map_pool = mpool
         self.map_votes = {m.emoji: 0 for m in self.map_pool}
-        await self.edit(embed=self._vote_embed())
-
-        for m in self.map_pool:
-            await self.add_reaction(m.emoji)
-
-        self.future = self.bot.loop.create_future()
-        self.bot.add_listener(self._process_vote, name='on_reaction_add')
+        self.editor = self._make_editor(self._embed)
+        await self.edit(embed=self._embed())
 
         try:
-            await asyncio.wait_for(self.future, 60)
+            await self._wait_for_reactions(self._process_vote, 60, [m.emoji for m in self.map_pool])
         except asyncio.TimeoutError:
             pass
 
-        self.bot.remove_listener(self._process_vote, name='on_reaction_add')
+        await self.editor.flush()
+
         try:
             await self.clear_reactions()
         except discord.errors.NotFound:
@@ -503,7 +513,6 @@ class MapVoteMessage(discord.Message):
         self.map_pool = [m for m in mpool if m.emoji in winners_emoji]
         self.voted_users = None
         self.map_votes = None
-        self.future = None
 
         if len(winners_emoji) == 1:
             return self.map_pool
@@ -515,26 +524,18 @@ class MapVoteMessage(discord.Message):
             return await self.vote(self.map_pool)
 
 
-class MapPoolMessage(discord.Message):
+class MapPoolMessage(Menu):
     """"""
+    __slots__ = ('user', 'pug_data', 'map_pool', 'active_maps', 'inactive_maps')
 
     def __init__(self, message, bot, user, pug_data):
         """"""
-        for attr_name in message.__slots__:
-            try:
-                attr_val = getattr(message, attr_name)
-            except AttributeError:
-                continue
-
-            setattr(self, attr_name, attr_val)
-
-        self.bot = bot
+        super().__init__(message, bot)
         self.user = user
         self.pug_data = pug_data
         self.map_pool = None
         self.active_maps = None
         self.inactive_maps = None
-        self.future = None
 
     def _pick_embed(self, footer=None):
         embed = self.bot.embed_template(title=translate('message-map-pool'))
@@ -557,7 +558,7 @@ class MapPoolMessage(discord.Message):
 
     async def _process_pick(self, reaction, user):
         """"""
-        if reaction.message.id != self.id or user == self.author:
+        if user == self.bot.user:
             return
 
         emoji = str(reaction.emoji)
@@ -568,11 +569,7 @@ class MapPoolMessage(discord.Message):
             else:
                 footer = 'Changes have been saved'
                 await self.edit(embed=self._pick_embed(footer))
-                if self.future is not None:
-                    try:
-                        self.future.set_result(None)
-                    except asyncio.InvalidStateError:
-                        pass
+                self._finish()
                 return
 
         if emoji not in [m.emoji for m in self.bot.all_maps.values()] or user != self.user:
@@ -599,19 +596,12 @@ class MapPoolMessage(discord.Message):
 
         await self.edit(embed=self._pick_embed())
 
-        awaitables = [self.add_reaction(m.emoji) for m in self.bot.all_maps.values()]
-        await asyncio.gather(*awaitables, loop=self.bot.loop)
-        await self.add_reaction('✅')
-
-        self.future = self.bot.loop.create_future()
-        self.bot.add_listener(self._process_pick, name='on_reaction_add')
+        emojis = [m.emoji for m in self.bot.all_maps.values()] + ['✅']
 
         try:
-            await asyncio.wait_for(self.future, 300)
+            await self._wait_for_reactions(self._process_pick, 300, emojis)
         except asyncio.TimeoutError:
-            self.bot.remove_listener(self._process_pick, name='on_reaction_add')
             return
-        self.bot.remove_listener(self._process_pick, name='on_reaction_add')
 
         map_pool_data = {m.dev_name: m.dev_name in self.map_pool for m in self.bot.all_maps.values()}
         await self.bot.db.update_pug(self.pug_data.id, **map_pool_data)
@@ -5,73 +5,216 @@ import asyncio
 import json
 import logging
 import datetime
+import math
+from array import array
 from os import environ
 from dotenv import load_dotenv
 
+from . import metrics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 load_dotenv()
 
 
+def rating(kills, deaths, rounds, k1, k2, k3, k4, k5):
+    """ Compute the HLTV 1.0 rating the same way as G5API. """
+    if not rounds:
+        return 0.0
+
+    kill_rating = kills / rounds / 0.679
+    survival_rating = (rounds - deaths) / rounds / 0.317
+    multi_kill_rating = (k1 + 4 * k2 + 9 * k3 + 16 * k4 + 25 * k5) / rounds / 1.277
+    return (kill_rating + 0.7 * survival_rating + multi_kill_rating) / 2.7
+
+
+
+def stats_rows(match_id, winner, players, finished_at):
+    """ Convert the G5API player stats of a finished match into match_player_stats rows. """
+    return [(
+        match_id,
+        player['map_id'],
+        player['steam_id'],
+        player['name'],
+        player['kills'],
+        player['deaths'],
+        player['assists'],
+        player['k1'],
+        player['k2'],
+        player['k3'],
+        player['k4'],
+        player['k5'],
+        player['v1'],
+        player['v2'],
+        player['v3'],
+        player['v4'],
+        player['v5'],
+        player['roundsplayed'],
+        player['flashbang_assists'],
+        player['damage'],
+        player['headshot_kills'],
+        player['team_id'] == winner,
+        rating(player['kills'], player['deaths'], player['roundsplayed'],
+               player['k1'], player['k2'], player['k3'], player['k4'], player['k5']),
+        finished_at
+    ) for player in players]
+
+# PlayerStats attribute of each player_stats column
+STATS_ATTRIBUTES = {
+    'kills': 'kills', 'deaths': 'deaths', 'assists': 'assists',
+    'k1': 'k1', 'k2': 'k2', 'k3': 'k3', 'k4': 'k4', 'k5': 'k5',
+    'v1': 'v1', 'v2': 'v2', 'v3': 'v3', 'v4': 'v4', 'v5': 'v5',
+    'rounds': 'trp', 'flashbang_assists': 'fba', 'damage': 'total_damage', 'headshot_kills': 'hsk',
+    'wins': 'wins', 'total_maps': 'total_maps'
+}
+
+
 class PlayerStats:
-    """"""
-    def __init__(self, json_data, web_url=None):
+    """ Total stats of a player, the derived stats are only computed when they are read. """
+    __slots__ = ('steam', 'discord', 'name', 'web_url', 'recent_ratings', 'form', '_average_rating') \
+        + tuple(STATS_ATTRIBUTES.values())
+
+    def __init__(self, steam, discord, row=None, web_url=None):
+        """ Set attributes from a player_stats row, or empty stats if the row is None. """
+        self.steam = steam
+        self.discord = discord
+        self.name = row and row['name'] or 'Unknown'
+        self.web_url = web_url
+        self.recent_ratings = row and row.get('recent_ratings') or []
+        self.form = row.get('form') if row else None
+        self._average_rating = None
+
+        for column, attribute in STATS_ATTRIBUTES.items():
+            setattr(self, attribute, row[column] if row else 0)
+
+    @property
+    def average_rating(self):
         """"""
-        self.steam = json_data['steamId']
-        self.discord = json_data['discord']
-        self.name = json_data['name']
-        self.kills = json_data['kills']
-        self.deaths = json_data['deaths']
-        self.assists = json_data['assists']
-        self.k1 = json_data['k1']
-        self.k2 = json_data['k2']
-        self.k3 = json_data['k3']
-        self.k4 = json_data['k4']
-        self.k5 = json_data['k5']
-        self.v1 = json_data['v1']
-        self.v2 = json_data['v2']
-        self.v3 = json_data['v3']
-        self.v4 = json_data['v4']
-        self.v5 = json_data['v5']
-        self.trp = json_data['trp']
-        self.fba = json_data['fba']
-        self.total_damage = json_data['total_damage']
-        self.hsk = json_data['hsk']
-        self.hsp = json_data['hsp'] + '%'
-        self.average_rating = float(json_data['average_rating'])
-        self.wins = json_data['wins']
-        self.total_maps = json_data['total_maps']
-        self.win_percent = f'{self.wins / self.total_maps * 100:.2f}%' if self.total_maps else '0.00%'
-        self.kdr = f'{self.kills / self.deaths:.2f}' if self.deaths else '0.00'
-        self.profile = f'{web_url}/user/{self.steam}'
-
-
-def new_player(steam):
-    """"""
-    return {
-        'steamId': steam,
-        'name': 'Unknown',
-        'kills': 0,
-        'deaths': 0,
-        'assists': 0,
-        'k1': 0,
-        'k2': 0,
-        'k3': 0,
-        'k4': 0,
-        'k5': 0,
-        'v1': 0,
-        'v2': 0,
-        'v3': 0,
-        'v4': 0,
-        'v5': 0,
-        'trp': 0,
-        'fba': 0,
-        'total_damage': 0,
-        'hsk': 0,
-        'hsp': '0.00',
-        'average_rating': '0.00',
-        'wins': 0,
-        'total_maps': 0
-    }
+        if self._average_rating is None:
+            player_rating = rating(self.kills, self.deaths, self.trp, self.k1, self.k2, self.k3, self.k4, self.k5)
+            self._average_rating = round(player_rating, 2)
+
+        return self._average_rating
+
+    @property
+    def recent_rating(self):
+        """ Get the mean rating of the last maps, or the average rating if the player has no recent maps. """
+        if not self.recent_ratings:
+            return self.average_rating
+
+        return round(sum(self.recent_ratings) / len(self.recent_ratings), 2)
+
+    @property
+    def form_rating(self):
+        """ Get the exponentially decayed rating of the last maps, or the average rating if there is none. """
+        return self.average_rating if self.form is None else round(self.form, 2)
+
+    @property
+    def hsp(self):
+        """"""
+        return f'{self.hsk / self.kills * 100 if self.kills else 0:.2f}%'
+
+    @property
+    def win_percent(self):
+        """"""
+        return f'{self.wins / self.total_maps * 100:.2f}%' if self.total_maps else '0.00%'
+
+    @property
+    def kdr(self):
+        """"""
+        return f'{self.kills / self.deaths:.2f}' if self.deaths else '0.00'
+
+    @property
+    def profile(self):
+        """"""
+        return f'{self.web_url}/user/{self.steam}'
+
+
+class PlayerStatsBatch:
+    """ Stats of many players stored as one array per column, ratings are computed and ranked for all at once.
+
+    The columns are NumPy arrays when NumPy is installed and standard library arrays otherwise.
+    """
+    __slots__ = ('steam_ids', 'discord_ids', 'names', 'recent_ratings', 'columns', 'forms', 'web_url', '_ratings')
+
+    def __init__(self, steam_ids, discord_ids, rows, web_url=None):
+        """ Set attributes from player_stats rows, a row is None for a player without stats. """
+        self.steam_ids = list(steam_ids)
+        self.discord_ids = list(discord_ids)
+        rows = list(rows)
+        self.names = [row['name'] if row else None for row in rows]
+        self.recent_ratings = [row.get('recent_ratings') if row else None for row in rows]
+        self.columns = {
+            column: self._column([row[column] if row else 0 for row in rows]) for column in STATS_ATTRIBUTES
+        }
+        forms = [row.get('form') if row else None for row in rows]
+        self.forms = self._column([math.nan if form is None else form for form in forms], 'd')
+        self.web_url = web_url
+        self._ratings = None
+
+    @staticmethod
+    def _column(values, typecode='q'):
+        """"""
+        if numpy is not None:
+            return numpy.array(values, dtype=numpy.int64 if typecode == 'q' else numpy.float64)
+
+        return array(typecode, values)
+
+    def __len__(self):
+        """"""
+        return len(self.steam_ids)
+
+    def __getitem__(self, index):
+        """ Get the stats of the player at an index. """
+        row = {column: int(values[index]) for column, values in self.columns.items()}
+        row['name'] = self.names[index]
+        row['recent_ratings'] = self.recent_ratings[index]
+        row['form'] = None if math.isnan(self.forms[index]) else float(self.forms[index])
+        return PlayerStats(self.steam_ids[index], self.discord_ids[index], row, self.web_url)
+
+    def __iter__(self):
+        """"""
+        return (self[index] for index in range(len(self)))
+
+    @property
+    def ratings(self):
+        """ Get the rating of every player. """
+        if self._ratings is None:
+            c = self.columns
+
+            if numpy is None:
+                self._ratings = array('d', map(rating, c['kills'], c['deaths'], c['rounds'],
+                                               c['k1'], c['k2'], c['k3'], c['k4'], c['k5']))
+            else:
+                rounds = numpy.maximum(c['rounds'], 1)
+                kill_rating = c['kills'] / rounds / 0.679
+                survival_rating = (c['rounds'] - c['deaths']) / rounds / 0.317
+                multi_kills = c['k1'] + 4 * c['k2'] + 9 * c['k3'] + 16 * c['k4'] + 25 * c['k5']
+                ratings = (kill_rating + 0.7 * survival_rating + multi_kills / rounds / 1.277) / 2.7
+                self._ratings = numpy.where(c['rounds'] > 0, ratings, 0.0)
+
+        return self._ratings
+
+    @property
+    def form_ratings(self):
+        """ Get the form rating of every player, or their rating if they have no recent maps. """
+        if numpy is None:
+            return array('d', (rating if math.isnan(form) else form for form, rating in zip(self.forms, self.ratings)))
+
+        return numpy.where(numpy.isnan(self.forms), self.ratings, self.forms)
+
+    def ranking(self, form=False):
+        """ Get the indexes of the players from the best to the worst rated, by recent form if form is True. """
+        ratings = self.form_ratings if form else self.ratings
+
+        if numpy is None:
+            return sorted(range(len(self)), key=ratings.__getitem__, reverse=True)
+
+        return numpy.argsort(-ratings, kind='stable').tolist()
 
 
 class MatchServer:
@@ -133,9 +276,16 @@ class ApiHelper:
         trace_config.on_request_start.append(start_request_log)
         trace_config.on_request_end.append(end_request_log)
 
+        # Register trace config handlers feeding the request latency metrics
+        metrics_trace_config = aiohttp.TraceConfig()
+        metrics_trace_config.on_request_start.append(metrics.start_api_request)
+        metrics_trace_config.on_request_end.append(metrics.end_api_request)
+        metrics_trace_config.on_request_exception.append(metrics.fail_api_request)
+
         # Start session
         self.logger.info('Starting API helper client session')
-        self.session = aiohttp.ClientSession(loop=loop, json_serialize=lambda x: json.dumps(x, ensure_ascii=False))
+        self.session = aiohttp.ClientSession(loop=loop, json_serialize=lambda x: json.dumps(x, ensure_ascii=False),
+                                             trace_configs=[metrics_trace_config])
 
     async def close(self):
         """ Close the API helper's session. """
@@ -234,8 +384,8 @@ class ApiHelper:
         async with self.session.get(url=url) as resp:
             return resp.status < 400
 
-    async def matches_status(self, auth):
-        """"""
+    async def my_matches(self, auth):
+        """ Get the matches of the G5API user of a guild. """
         url = f'{self.web_url}/matches/mymatches'
         data = {
             'user_id': auth['user_id'],
@@ -244,7 +394,11 @@ class ApiHelper:
 
         async with self.session.get(url=url, json=[data]) as resp:
             resp_data = await resp.json()
-            return {match['id']: match['end_time'] is None for match in resp_data['matches']}
+            return resp_data['matches']
+
+    async def matches_status(self, auth):
+        """"""
+        return {match['id']: match['end_time'] is None for match in await self.my_matches(auth)}
 
     async def get_team(self, team_id):
         """"""
@@ -413,38 +567,3 @@ class ApiHelper:
 
         async with self.session.get(url=url, json=[data]) as resp:
             return resp.status
-
-    async def player_stats(self, user_data):
-        """"""
-        url = f'{self.web_url}/playerstats/{user_data.steam}/pug'
-
-        async with self.session.get(url=url) as resp:
-            resp_data = await resp.json()
-            try:
-                resp_data['pugstats']['discord'] = user_data.discord.id
-                return PlayerStats(resp_data['pugstats'], self.web_url)
-            except KeyError:
-                return PlayerStats(new_player(user_data.steam), self.web_url)
-
-    async def leaderboard(self, users):
-        """"""
-        users_data = await self.bot.db.get_users([user.id for user in users])
-        if not users_data:
-            return
-        users_dict = dict(zip([data[1] for data in users_data], [data[0] for data in users_data]))
-
-        url = f'{self.web_url}/leaderboard/players/pug'
-
-        async with self.session.get(url=url) as resp:
-            resp_data = await resp.json()
-            players = list(filter(lambda x: x['steamId'] in list(users_dict.keys()), resp_data['leaderboard']))
-
-            for steam_id in list(users_dict.keys()):
-                if steam_id not in [p['steamId'] for p in players]:
-                    players.append(new_player(steam_id))
-
-            for player in players:
-                player['discord'] = list(map(users_dict.get, [player['steamId']]))[0]
-
-            players.sort(key=lambda x: list(users_dict.keys()).index(x['steamId']))
-            return [PlayerStats(player, self.web_url) for player in players]
@@ -4,8 +4,29 @@
 import asyncio
 import asyncpg
 import logging
+import zlib
 
+from .metrics import DB_QUERY_SECONDS, time_methods
 
+
+STATS_COLUMNS = ('kills', 'deaths', 'assists', 'k1', 'k2', 'k3', 'k4', 'k5', 'v1', 'v2', 'v3', 'v4', 'v5',
+                 'rounds', 'flashbang_assists', 'damage', 'headshot_kills')
+
+RATING_HISTORY_SIZE = 20  # Number of last map ratings kept per player
+FORM_WEIGHT = 0.2  # Weight of a new map rating in the exponentially decayed form rating
+
+# HLTV 1.0 rating of the player_stats totals, same formula as api.rating()
+RATING_SQL = (
+    'CASE WHEN player_stats.rounds = 0 THEN 0 ELSE (\n'
+    '    player_stats.kills::REAL / player_stats.rounds / 0.679\n'
+    '    + 0.7 * (player_stats.rounds - player_stats.deaths)::REAL / player_stats.rounds / 0.317\n'
+    '    + (player_stats.k1 + 4 * player_stats.k2 + 9 * player_stats.k3 + 16 * player_stats.k4\n'
+    '        + 25 * player_stats.k5)::REAL / player_stats.rounds / 1.277\n'
+    ') / 2.7 END'
+)
+
+
+@time_methods(DB_QUERY_SECONDS, 'query', exclude=('close',))
 class DBHelper:
     """ Class to contain database query wrapper functions. """
 
@@ -15,12 +36,86 @@ class DBHelper:
         self.logger = logging.getLogger('PUGs.db')
         self.logger.info('Creating database connection pool')
         self.pool = loop.run_until_complete(asyncpg.create_pool(connect_url))
+        self.leader_connection = None
+        self.leaderships = set()
+        self.leader_lock = asyncio.Lock()  # Queries can't overlap on the leader connection
 
     async def close(self):
         """"""
+        for name in list(self.leaderships):
+            await self.release_leadership(name)
+
         self.logger.info('Closing database connection pool')
         await self.pool.close()
 
+    @staticmethod
+    def _lock_key(name):
+        """ Convert a job name into a stable advisory lock key. """
+        return zlib.crc32(f'PUGs.{name}'.encode())
+
+    async def _drop_leader_connection(self):
+        """ Give the connection holding the advisory locks back to the pool, which drops all of them. """
+        connection = self.leader_connection
+        self.leader_connection = None
+        self.leaderships.clear()
+
+        if connection is not None:
+            await self.pool.release(connection)
+
+    async def acquire_leadership(self, name):
+        """ Try to become the instance running the named job and return whether this instance holds it.
+
+        The session level advisory locks live on one connection kept out of the pool, so Postgres releases them as
+        soon as the holding instance dies and the next instance to try takes over.
+        """
+        async with self.leader_lock:
+            if self.leader_connection is not None:
+                try:
+                    await self.leader_connection.fetchval('SELECT 1;')
+                except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError):
+                    self.logger.warning(f'Lost leadership of jobs {sorted(self.leaderships)}')
+                    await self._drop_leader_connection()
+
+            if name in self.leaderships:
+                return True
+
+            if self.leader_connection is None:
+                self.leader_connection = await self.pool.acquire()
+
+            try:
+                is_leader = await self.leader_connection.fetchval('SELECT pg_try_advisory_lock($1);',
+                                                                  self._lock_key(name))
+            except Exception:
+                await self._drop_leader_connection()
+                raise
+
+            if not is_leader:
+                if not self.leaderships:
+                    await self._drop_leader_connection()
+                return False
+
+            self.logger.info(f'Acquired leadership of "{name}" job')
+            self.leaderships.add(name)
+            return True
+
+    async def release_leadership(self, name):
+        """ Give up the named job so that another instance can pick it up. """
+        async with self.leader_lock:
+            if name not in self.leaderships:
+                return
+
+            self.leaderships.discard(name)
+
+            try:
+                await self.leader_connection.execute('SELECT pg_advisory_unlock($1);', self._lock_key(name))
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError):
+                await self._drop_leader_connection()
+
+            self.logger.info(f'Released leadership of "{name}" job')
+
+            if not self.leaderships:
+                await self._drop_leader_connection()
+
     @staticmethod
     def _get_record_attrs(records, key):
         """ Get key list of attributes from list of Record objects. """
@@ -59,17 +154,16 @@ class DBHelper:
 
     async def insert_guilds(self, *guild_ids):
         """ Add a list of guilds into the guilds table and return the ones successfully added. """
-        rows = [(guild_id, None, None, None, None) for guild_id in guild_ids]
         statement = (
             'INSERT INTO guilds (id)\n'
-            '    (SELECT id FROM unnest($1::guilds[]))\n'
+            '    (SELECT unnest($1::BIGINT[]))\n'
             '    ON CONFLICT (id) DO NOTHING\n'
             '    RETURNING id;'
         )
 
         async with self.pool.acquire() as connection:
             async with connection.transaction():
-                inserted = await connection.fetch(statement, rows)
+                inserted = await connection.fetch(statement, guild_ids)
 
         return self._get_record_attrs(inserted, 'id')
 
@@ -89,10 +183,9 @@ class DBHelper:
 
     async def sync_guilds(self, *guild_ids):
         """ Synchronizes the guilds table with the guilds in the bot. """
-        insert_rows = [(guild_id, None, None, None, None) for guild_id in guild_ids]
         insert_statement = (
             'INSERT INTO guilds (id)\n'
-            '    (SELECT id FROM unnest($1::guilds[]))\n'
+            '    (SELECT unnest($1::BIGINT[]))\n'
             '    ON CONFLICT (id) DO NOTHING\n'
             '    RETURNING id;'
         )
@@ -104,7 +197,7 @@ class DBHelper:
 
         async with self.pool.acquire() as connection:
             async with connection.transaction():
-                inserted = await connection.fetch(insert_statement, insert_rows)
+                inserted = await connection.fetch(insert_statement, guild_ids)
                 deleted = await connection.fetch(delete_statement, guild_ids)
 
         return self._get_record_attrs(inserted, 'id'), self._get_record_attrs(deleted, 'id')
@@ -164,6 +257,139 @@ class DBHelper:
                         self._get_record_attrs(user, 'steam_id'),
                         self._get_record_attrs(user, 'flag')))
 
+    async def insert_match_stats(self, guild_id, rows):
+        """ Insert the map stats of the players of a finished match and add them to the players' totals.
+
+        Map stats already inserted are skipped, so inserting the stats of a match twice doesn't count them twice.
+        The leaderboards of the guilds the updated players have played in and the updated players' recent ratings
+        are refreshed in the same transaction.
+        """
+        stats_statement = (
+            'WITH inserted AS (\n'
+            '    INSERT INTO match_player_stats\n'
+            '        (SELECT * FROM unnest($1::match_player_stats[]))\n'
+            '        ON CONFLICT DO NOTHING\n'
+            '        RETURNING *\n'
+            '), totals AS (\n'
+            f'    INSERT INTO player_stats (steam_id, name, {", ".join(STATS_COLUMNS)}, wins, total_maps)\n'
+            f'        (SELECT steam_id, MAX(name), {", ".join(f"SUM({col})" for col in STATS_COLUMNS)},\n'
+            '            COUNT(*) FILTER (WHERE won), COUNT(*)\n'
+            '            FROM inserted GROUP BY steam_id)\n'
+            '        ON CONFLICT (steam_id) DO UPDATE SET\n'
+            '            name = EXCLUDED.name,\n'
+            f'            {", ".join(f"{col} = player_stats.{col} + EXCLUDED.{col}" for col in STATS_COLUMNS)},\n'
+            '            wins = player_stats.wins + EXCLUDED.wins,\n'
+            '            total_maps = player_stats.total_maps + EXCLUDED.total_maps\n'
+            ')\n'
+            'SELECT steam_id, ARRAY_AGG(rating ORDER BY map_id) AS ratings FROM inserted\n'
+            '    GROUP BY steam_id;'
+        )
+
+        players_statement = (
+            'INSERT INTO guild_players (guild_id, steam_id)\n'
+            '    (SELECT $1, steam_id FROM unnest($2::VARCHAR[]) AS steam_id)\n'
+            '    ON CONFLICT DO NOTHING;'
+        )
+        leaderboard_statement = (
+            'INSERT INTO guild_leaderboard (guild_id, rank, steam_id, rating)\n'
+            '    (SELECT guild_id, ROW_NUMBER() OVER (PARTITION BY guild_id ORDER BY rating DESC, steam_id),\n'
+            '        steam_id, rating FROM (\n'
+            f'        SELECT guild_players.guild_id, player_stats.steam_id, {RATING_SQL} AS rating\n'
+            '            FROM guild_players\n'
+            '            JOIN player_stats ON player_stats.steam_id = guild_players.steam_id\n'
+            '            WHERE guild_players.guild_id IN (\n'
+            '                SELECT guild_id FROM guild_players WHERE steam_id = ANY($1::VARCHAR[])\n'
+            '            )\n'
+            '    ) AS ratings)\n'
+            '    ON CONFLICT (guild_id, rank) DO UPDATE SET\n'
+            '        steam_id = EXCLUDED.steam_id,\n'
+            '        rating = EXCLUDED.rating\n'
+            '    WHERE (guild_leaderboard.steam_id, guild_leaderboard.rating)\n'
+            '        IS DISTINCT FROM (EXCLUDED.steam_id, EXCLUDED.rating);'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                inserted = await connection.fetch(stats_statement, rows)
+                await connection.execute(players_statement, guild_id, list({row[2] for row in rows}))
+                updated = self._get_record_attrs(inserted, 'steam_id')
+
+                if updated:
+                    await connection.execute(leaderboard_statement, updated)
+                    await self._update_players_form(connection, inserted)
+
+        return updated
+
+    @staticmethod
+    async def _update_players_form(connection, inserted):
+        """ Append the new map ratings of players to their last ratings and decay them into their form rating. """
+        select_statement = (
+            'SELECT * FROM player_form\n'
+            '    WHERE steam_id = ANY($1::VARCHAR[])\n'
+            '    FOR UPDATE;'
+        )
+        upsert_statement = (
+            'INSERT INTO player_form (steam_id, ratings, form)\n'
+            '    (SELECT * FROM unnest($1::player_form[]))\n'
+            '    ON CONFLICT (steam_id) DO UPDATE SET\n'
+            '        ratings = EXCLUDED.ratings,\n'
+            '        form = EXCLUDED.form;'
+        )
+
+        steam_ids = [row['steam_id'] for row in inserted]
+        forms = {row['steam_id']: row for row in await connection.fetch(select_statement, steam_ids)}
+        upsert_rows = []
+
+        for row in inserted:
+            current = forms.get(row['steam_id'])
+            ratings = list(current['ratings']) if current else []
+            form = current['form'] if current else None
+
+            for rating in row['ratings']:
+                form = rating if form is None else FORM_WEIGHT * rating + (1 - FORM_WEIGHT) * form
+
+            ratings = (ratings + list(row['ratings']))[-RATING_HISTORY_SIZE:]
+            upsert_rows.append((row['steam_id'], ratings, form))
+
+        await connection.execute(upsert_statement, upsert_rows)
+
+    async def get_players_stats(self, *steam_ids):
+        """ Get the total stats and recent ratings of players indexed by steam id. """
+        statement = (
+            'SELECT player_stats.*, player_form.ratings AS recent_ratings, player_form.form FROM player_stats\n'
+            '    LEFT JOIN player_form ON player_form.steam_id = player_stats.steam_id\n'
+            '    WHERE player_stats.steam_id = ANY($1::VARCHAR[]);'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                rows = await connection.fetch(statement, steam_ids)
+
+        return {row['steam_id']: dict(row.items()) for row in rows}
+
+    async def get_guild_leaderboard(self, guild_id, first_rank, last_rank):
+        """ Get the ranked players of a guild between two ranks and the number of ranked players of the guild. """
+        total_statement = (
+            'SELECT COALESCE(MAX(rank), 0) FROM guild_leaderboard\n'
+            '    WHERE guild_id = $1;'
+        )
+        statement = (
+            'SELECT guild_leaderboard.rank, player_stats.*,\n'
+            '    (SELECT discord_id FROM users\n'
+            '        WHERE users.steam_id = guild_leaderboard.steam_id LIMIT 1) AS discord_id\n'
+            '    FROM guild_leaderboard\n'
+            '    JOIN player_stats ON player_stats.steam_id = guild_leaderboard.steam_id\n'
+            '    WHERE guild_leaderboard.guild_id = $1 AND guild_leaderboard.rank BETWEEN $2 AND $3\n'
+            '    ORDER BY guild_leaderboard.rank;'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                total = await connection.fetchval(total_statement, guild_id)
+                rows = await connection.fetch(statement, guild_id, first_rank, last_rank)
+
+        return [dict(row.items()) for row in rows], total
+
     async def insert_users(self, discord_id, steam_id, flag):
         """ Insert multiple users into the users table. """
         statement = (
@@ -435,17 +661,103 @@ class DBHelper:
 
         return self._get_record_attrs(deleted, 'user_id')
 
+    async def get_map_emojis(self, *emoji_ids):
+        """ Get the icon hash each map emoji was uploaded from. """
+        statement = (
+            'SELECT emoji_id, hash FROM map_emojis\n'
+            '    WHERE emoji_id = ANY($1::BIGINT[]);'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                rows = await connection.fetch(statement, emoji_ids)
+
+        return {row['emoji_id']: row['hash'] for row in rows}
+
+    async def insert_map_emojis(self, emoji_hashes):
+        """ Save the icon hash of map emojis from a dictionary of emoji id to hash. """
+        statement = (
+            'INSERT INTO map_emojis (emoji_id, hash)\n'
+            '    (SELECT * FROM unnest($1::map_emojis[]))\n'
+            '    ON CONFLICT (emoji_id) DO UPDATE SET hash = EXCLUDED.hash;'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(statement, list(emoji_hashes.items()))
+
+    async def delete_map_emojis(self, *emoji_ids):
+        """ Remove a list of emojis from the map_emojis table and return the ones successfully removed. """
+        statement = (
+            'DELETE FROM map_emojis\n'
+            '    WHERE emoji_id = ANY($1::BIGINT[])\n'
+            '    RETURNING emoji_id;'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                deleted = await connection.fetch(statement, emoji_ids)
+
+        return self._get_record_attrs(deleted, 'emoji_id')
+
+    async def get_guilds_auth(self):
+        """ Get the G5API credentials of the guilds that set them. """
+        statement = (
+            'SELECT id, user_id, api_key FROM guilds\n'
+            '    WHERE user_id IS NOT NULL AND api_key IS NOT NULL;'
+        )
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                rows = await connection.fetch(statement)
+
+        return {row['id']: {'user_id': row['user_id'], 'api_key': row['api_key']} for row in rows}
+
+    async def get_guilds_state(self, *guild_ids):
+        """ Get the rows of guilds and of their pugs, queued users, matches and match users, one query per table. """
+        statements = {
+            'guilds': (
+                'SELECT * FROM guilds\n'
+                '    WHERE id::BIGINT = ANY($1::BIGINT[]);'
+            ),
+            'pugs': (
+                'SELECT * FROM pugs\n'
+                '    WHERE guild::BIGINT = ANY($1::BIGINT[]);'
+            ),
+            'queued_users': (
+                'SELECT queued_users.* FROM queued_users\n'
+                '    JOIN pugs ON pugs.id = queued_users.pug_id\n'
+                '    WHERE pugs.guild::BIGINT = ANY($1::BIGINT[]);'
+            ),
+            'matches': (
+                'SELECT * FROM matches\n'
+                '    WHERE guild::BIGINT = ANY($1::BIGINT[]);'
+            ),
+            'match_users': (
+                'SELECT match_users.* FROM match_users\n'
+                '    JOIN matches ON matches.id = match_users.match_id\n'
+                '    WHERE matches.guild::BIGINT = ANY($1::BIGINT[]);'
+            )
+        }
+
+        async with self.pool.acquire() as connection:
+            async with connection.transaction(isolation='repeatable_read', readonly=True):
+                return {
+                    table: [dict(row.items()) for row in await connection.fetch(statement, guild_ids)]
+                    for table, statement in statements.items()
+                }
+
     async def get_all_matches(self):
-        """ Get a match's row from the matches table. """
+        """ Get the guild of every match from the matches table, indexed by match id. """
         statement = (
-            'SELECT id FROM matches;'
+            'SELECT id, guild FROM matches;'
         )
 
         async with self.pool.acquire() as connection:
             async with connection.transaction():
-                row = await connection.fetch(statement)
+                rows = await connection.fetch(statement)
 
-        return self._get_record_attrs(row, 'id')
+        return {row['id']: row['guild'] for row in rows}
 
     async def get_pug(self, row_id, column='id'):
         """ Get a pug's row from the pugs table. """
@@ -0,0 +1,127 @@
+# draft.py
+
+
+def snake_order(length):
+    """ Get the team index picking at each pick number (1, 2, 2, 1, 1, 2, 2, ...). """
+    order = [0]
+
+    while len(order) < length:
+        order.extend((1, 1, 0, 0))
+
+    return tuple(order[:length])
+
+
+class DraftEngine:
+    """ Discord-free state machine of a captains team draft.
+
+    Players are indexed by their slot (position in the player list), which is what the menus map their emojis to.
+    Every captain assignment and pick is recorded in an event log that can be replayed into a new engine.
+    """
+    __slots__ = ('players', 'slots', 'pick_order', 'remaining', 'teams', 'team_of', 'pick_number', 'events')
+
+    def __init__(self, players):
+        """ Set attributes. """
+        self.players = tuple(players)
+        self.slots = {player: slot for slot, player in enumerate(self.players)}
+        self.pick_order = snake_order(len(self.players))
+        self.remaining = set(range(len(self.players)))
+        self.teams = ([], [])
+        self.team_of = {}
+        self.pick_number = 0
+        self.events = []
+
+    @classmethod
+    def replay(cls, players, events):
+        """ Build an engine in the state reached by applying an event log. """
+        engine = cls(players)
+
+        for event, *args in events:
+            if event == 'captain':
+                team, slot = args
+                engine.set_captain(team, engine.players[slot])
+            elif event == 'pick':
+                picker_slot, pickee_slot = args
+                if not engine.pick(engine.players[picker_slot], engine.players[pickee_slot]):
+                    raise ValueError(f'Invalid pick in draft event log: {picker_slot} -> {pickee_slot}')
+            else:
+                raise ValueError(f'Unknown draft event "{event}"')
+
+        return engine
+
+    @property
+    def captains(self):
+        """ Get the captain of each team or None if the team has no captain yet. """
+        return tuple(team[0] if team else None for team in self.teams)
+
+    @property
+    def active_picker(self):
+        """ Get the captain whose turn it is to pick. """
+        if self.pick_number >= len(self.pick_order):
+            return None
+
+        picking_team = self.teams[self.pick_order[self.pick_number]]
+        return picking_team[0] if picking_team else None
+
+    @property
+    def done(self):
+        """ Check if every player has been drafted. """
+        return not self.remaining
+
+    def is_remaining(self, player):
+        """ Check if a player can still be picked. """
+        return self.slots.get(player) in self.remaining
+
+    def _add(self, team, player):
+        """ Move a player from the remaining pool to a team. """
+        self.remaining.discard(self.slots[player])
+        self.teams[team].append(player)
+        self.team_of[player] = team
+
+    def set_captain(self, team, player):
+        """ Make a remaining player the captain of an empty team. """
+        if self.teams[team] or not self.is_remaining(player):
+            raise ValueError('Captains can only be assigned to empty teams from the remaining players')
+
+        self._add(team, player)
+        self.events.append(('captain', team, self.slots[player]))
+
+    def pick(self, picker, pickee):
+        """ Pick a player for the team of the picker and return whether the pick was allowed.
+
+        A player picking while a team has no captain volunteers as the captain of that team.
+        """
+        if picker == pickee or picker not in self.slots or not self.is_remaining(pickee):
+            return False
+
+        picking_team = self.team_of.get(picker)
+
+        if picking_team is None:
+            if not self.teams[0]:
+                picking_team = 0
+            elif not self.teams[1]:
+                picking_team = 1
+            else:
+                return False
+            self.set_captain(picking_team, picker)
+
+            if len(self.remaining) == 1 and not self.teams[1 - picking_team]:
+                # The pickee is the only one left to captain the other team
+                self.set_captain(1 - picking_team, pickee)
+                return True
+
+        if picker != self.active_picker:
+            return False
+
+        if len(self.teams[picking_team]) > len(self.players) // 2:
+            return False
+
+        self._add(picking_team, pickee)
+        self.pick_number += 1
+        self.events.append(('pick', self.slots[picker], self.slots[pickee]))
+
+        if len(self.remaining) == 1:
+            last_slot = next(iter(self.remaining))
+            smaller_team = 0 if len(self.teams[0]) <= len(self.teams[1]) else 1
+            self._add(smaller_team, self.players[last_slot])
+
+        return True
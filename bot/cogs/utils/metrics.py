@@ -0,0 +1,266 @@
+# metrics.py
+
+import asyncio
+import bisect
+import functools
+import logging
+import time
+
+from aiohttp import web
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    """ Format label pairs the way the Prometheus text format expects them. """
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+
+    if not pairs:
+        return ''
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    """"""
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """ Base of the metrics, holding one value per combination of label values. """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """ Set attributes and register the metric. """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.function = None
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        """ Get the label values of keyword labels in the order of the label names. """
+        return tuple(labels[name] for name in self.labelnames)
+
+    def set_function(self, function):
+        """ Read the values from a function when rendering, returning a number or a dict of label values tuples. """
+        self.function = function
+
+    def _samples(self):
+        """"""
+        if self.function is None:
+            return self.values.items()
+
+        values = self.function()
+        return values.items() if isinstance(values, dict) else [((), values)]
+
+    def render(self):
+        """ Get the lines of the metric in the Prometheus text format. """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+        for labelvalues, value in self._samples():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+
+        return lines
+
+
+class Counter(Metric):
+    """ Value that only goes up. """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """"""
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """ Value that goes up and down. """
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        """"""
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """ Distribution of observed values counted into cumulative buckets. """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """"""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """"""
+        key = self._key(labels)
+        series = self.values.get(key)
+
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, **labels):
+        """ Decorate a coroutine function to observe how long its calls take. """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+
+            return wrapper
+
+        return decorator
+
+    def render(self):
+        """"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+        for labelvalues, (counts, total) in self.values.items():
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+
+        return lines
+
+
+class Registry:
+    """ Collection of the metrics exposed by the bot. """
+
+    def __init__(self):
+        """"""
+        self.metrics = []
+
+    def register(self, metric):
+        """"""
+        self.metrics.append(metric)
+
+    def render(self):
+        """ Get every metric in the Prometheus text format. """
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = Histogram('pugs_command_seconds', 'Time taken to run a bot command', ('command',))
+DB_QUERY_SECONDS = Histogram('pugs_db_query_seconds', 'Time taken by a DBHelper query', ('query',))
+API_REQUEST_SECONDS = Histogram('pugs_api_request_seconds', 'Time taken by a G5API request', ('method', 'status'))
+DISCORD_RATE_LIMITS = Counter('pugs_discord_rate_limits_total', 'Discord REST requests that were rate limited')
+DISCORD_GLOBAL_RATE_LIMITS = Counter('pugs_discord_global_rate_limits_total',
+                                     'Discord REST requests that hit the global rate limit')
+DISCORD_RATE_LIMIT_SECONDS = Counter('pugs_discord_rate_limit_seconds_total',
+                                     'Seconds spent waiting for Discord REST rate limits')
+LOOP_LAG_SECONDS = Histogram('pugs_event_loop_lag_seconds', 'Delay of the event loop in running a scheduled callback',
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+LOOP_LAG_QUANTILES = Gauge('pugs_event_loop_lag_quantile_seconds', 'Recent event loop lag percentiles', ('quantile',))
+LOOP_STALLS = Counter('pugs_event_loop_stalls_total', 'Times the event loop was blocked longer than the threshold')
+LOBBIES = Gauge('pugs_lobbies', 'Lobbies loaded in memory')
+QUEUED_PLAYERS = Gauge('pugs_queued_players', 'Players waiting in the queues of the loaded lobbies')
+LOBBY_PENDING_EVENTS = Gauge('pugs_lobby_pending_events', 'Queue events waiting to be handled by the lobby workers')
+MATCHES_STARTED = Counter('pugs_matches_started_total', 'Matches created on G5API')
+MATCHES_FINISHED = Counter('pugs_matches_finished_total', 'Matches whose stats were saved after they ended')
+ACTIVE_MENUS = Gauge('pugs_active_menus', 'Menus waiting for reactions', ('menu',))
+OPENED_MENUS = Counter('pugs_menus_opened_total', 'Menus that started waiting for reactions', ('menu',))
+MENU_SECONDS = Histogram('pugs_menu_seconds', 'Time a menu waited for reactions', ('menu', 'outcome'),
+                         buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+MENU_REACTION_SECONDS = Histogram('pugs_menu_reaction_seconds', 'Time taken by a menu to handle a reaction', ('menu',))
+
+
+def time_methods(histogram, label, exclude=()):
+    """ Decorate a class to observe how long the calls of its public coroutine methods take. """
+    def decorator(cls):
+        for name, method in list(vars(cls).items()):
+            if not name.startswith('_') and name not in exclude and asyncio.iscoroutinefunction(method):
+                setattr(cls, name, histogram.time(**{label: name})(method))
+
+        return cls
+
+    return decorator
+
+
+async def start_api_request(session, ctx, params):
+    """"""
+    ctx.metrics_start = time.perf_counter()
+
+
+async def end_api_request(session, ctx, params):
+    """"""
+    elapsed = time.perf_counter() - ctx.metrics_start
+    API_REQUEST_SECONDS.observe(elapsed, method=params.method, status=params.response.status)
+
+
+async def fail_api_request(session, ctx, params):
+    """"""
+    elapsed = time.perf_counter() - ctx.metrics_start
+    API_REQUEST_SECONDS.observe(elapsed, method=params.method, status='error')
+
+
+class RateLimitFilter(logging.Filter):
+    """ Count the rate limits logged by discord.py's HTTP client without filtering out any record. """
+
+    def filter(self, record):
+        """"""
+        message = str(record.msg)
+
+        if message.startswith('We are being rate limited.'):
+            DISCORD_RATE_LIMITS.inc()
+            DISCORD_RATE_LIMIT_SECONDS.inc(record.args[0])
+        elif message.startswith('Global rate limit has been hit.'):
+            DISCORD_GLOBAL_RATE_LIMITS.inc()
+
+        return True
+
+
+logging.getLogger('discord.http').addFilter(RateLimitFilter())
+
+
+class MetricsServer:
+    """ Local HTTP server exposing the metrics on /metrics. """
+
+    def __init__(self, loop, host, port):
+        """ Set attributes. """
+        self.loop = loop
+        self.host = host
+        self.port = port
+        self.runner = None
+        self.logger = logging.getLogger('PUGs.metrics')
+
+    async def _metrics(self, request):
+        """"""
+        return web.Response(text=REGISTRY.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self):
+        """"""
+        app = web.Application()
+        app.router.add_get('/metrics', self._metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.logger.info(f'Serving metrics on http://{self.host}:{self.port}/metrics')
+
+    async def stop(self):
+        """"""
+        if self.runner is not None:
+            self.logger.info('Stopping metrics server')
+            await self.runner.cleanup()
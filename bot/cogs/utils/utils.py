@@ -1,39 +1,117 @@
 # utils.py
 
+import asyncio
 import os
 import re
 import json
+import hashlib
+import string
+import sys
+import contextvars
+import logging
 import math
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 from discord.ext import commands
-from discord.utils import get
 from discord.errors import NotFound, HTTPException
 
+from .api import PlayerStats, PlayerStatsBatch
+
 
 time_arg_pattern = re.compile(r'\b((?:(?P<days>[0-9]+)d)|(?:(?P<hours>[0-9]+)h)|(?:(?P<minutes>[0-9]+)m))\b')
 
 load_dotenv()
 
-with open('translations.json', encoding="utf8") as f:
-    translations = json.load(f)
+_BOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TRANSLATIONS_DIR = os.path.join(_BOT_DIR, 'translations')
+ASSETS_DIR = os.path.join(os.path.dirname(_BOT_DIR), 'assets')
+MAPS_MANIFEST = os.path.join(ASSETS_DIR, 'maps', 'manifest.json')
+EMOJI_UPLOAD_CONCURRENCY = 3
+MEMBER_CACHE_SIZE = 1000
+MEMBER_QUERY_LIMIT = 100
+EMBED_LIMIT = 6000
+
+
+class Catalog:
+    """ Translations compiled on first use of each language, with the fallback language merged into every language.
+
+    Keys are mapped once to their position in the tables, and each table is a tuple of (text without arguments,
+    format template) entries sharing the fallback entries it doesn't translate.
+    """
+
+    def __init__(self, directory, default_language, fallback_language='en'):
+        """ Compile the fallback and default languages. """
+        self.directory = directory
+        self.languages = sorted(file[:-5] for file in os.listdir(directory) if file.endswith('.json'))
+        fallback = self._load(fallback_language)
+        self.index = {sys.intern(key): num for num, key in enumerate(fallback)}
+        self.fallback = tuple(self._entry(text) for text in fallback.values())
+        self.tables = {fallback_language: self.fallback}
+        self.default_language = default_language if default_language in self.languages else fallback_language
+        self.default = self.table(self.default_language)
+
+    def _load(self, language):
+        """ Read the texts of a language file. """
+        with open(os.path.join(self.directory, f'{language}.json'), encoding='utf8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _entry(text):
+        """ Get the text without arguments and the format template of a text. """
+        return sys.intern(text.replace('{}', '')), sys.intern(text)
+
+    @staticmethod
+    def _fields(text):
+        """ Count the replacement fields of a text and raise ValueError if it can't be formatted. """
+        return sum(1 for _, field, _, _ in string.Formatter().parse(text) if field is not None)
+
+    def _compile(self, texts):
+        """ Build the table of a language from its texts. """
+        table = list(self.fallback)
+
+        for key, text in texts.items():
+            num = self.index.get(key)
+            if num is None:
+                continue
+
+            try:
+                fields = self._fields(text)
+            except ValueError:
+                continue
+
+            if fields == self._fields(self.fallback[num][1]):
+                table[num] = self._entry(text)
+
+        return tuple(table)
+
+    def table(self, language):
+        """ Get the table of a language, loading it on first use and falling back to the default language. """
+        try:
+            return self.tables[language]
+        except KeyError:
+            pass
 
+        if language not in self.languages:
+            return self.default
 
-def translate(text, *args):
-    trans_text = ''
-    if args:
-        try:
-            trans_text = translations[os.environ['DISCORD_BOT_LANGUAGE']][text].format(*args)
-        except (KeyError, ValueError):
-            trans_text = translations['en'][text].format(*args)
-    else:
-        try:
-            trans_text = translations[os.environ['DISCORD_BOT_LANGUAGE']][text].replace('{}', '')
-        except (KeyError, ValueError):
-            trans_text = translations['en'][text].replace('{}', '')
+        table = self.tables[language] = self._compile(self._load(language))
+        return table
+
+
+catalog = Catalog(TRANSLATIONS_DIR, os.environ.get('DISCORD_BOT_LANGUAGE'))
+current_table = contextvars.ContextVar('current_table', default=catalog.default)
+
+
+def set_language(language):
+    """ Translate the texts of the current task to a language, None being the default language. """
+    current_table.set(catalog.table(language))
 
-    return trans_text
+
+def translate(text, *args):
+    plain, template = current_table.get()[catalog.index[text]]
+    return template.format(*args) if args else plain
 
 
 def timedelta_str(tdelta):
@@ -92,6 +170,153 @@ def align_text(text, length, align='center'):
     return ' ' * pre + text + ' ' * post
 
 
+def field_values(lines, limit=1024):
+    """ Split lines into as few embed field values as possible without going over the field value limit. """
+    values = ['']
+
+    for line in lines:
+        if values[-1] and len(values[-1]) + len(line) > limit:
+            values.append('')
+        values[-1] += line
+
+    return values
+
+
+def fit_lines(name, lines, budget):
+    """ Keep the first lines whose fields fit in a number of characters, counting the other lines in a last line. """
+    lines = list(lines)
+    kept = len(lines)
+
+    while True:
+        fitted = lines[:kept] + ([f'… +{len(lines) - kept}\n'] if kept < len(lines) else [])
+        values = field_values(fitted)
+        # Continuation fields are named with a single zero width space
+        if kept == 0 or len(name) + len(values) - 1 + sum(len(value) for value in values) <= budget:
+            return fitted
+
+        kept -= 1
+
+
+def add_fields(embed, name, lines, inline=True, budget=None):
+    """ Add lines to an embed, continuing them in unnamed fields when they don't fit in a single field.
+
+    Lines past the budget, by default what is left of the embed's total length limit, are counted instead of shown.
+    """
+    if budget is None:
+        budget = EMBED_LIMIT - len(embed)
+
+    for value in field_values(fit_lines(name, lines, budget)):
+        embed.add_field(name=name, value=value, inline=inline)
+        name = '\u200b'
+
+
+class Debouncer:
+    """ Coalesce the calls to a coroutine function requested within a delay into a single call. """
+
+    def __init__(self, loop, delay, callback):
+        """ Set attributes. """
+        self.loop = loop
+        self.delay = delay
+        self.callback = callback
+        self.pending = False
+        self.task = None
+        self.lock = asyncio.Lock()
+
+    def schedule(self):
+        """ Request a call, running at most one call per delay. """
+        self.pending = True
+
+        if self.task is None:
+            self.task = self.loop.create_task(self._run())
+
+    async def _run(self):
+        """"""
+        try:
+            while self.pending:
+                await asyncio.sleep(self.delay)
+                await self.flush()
+        except Exception:
+            logging.getLogger('PUGs.bot').exception(f'Uncaught exception in scheduled call to {self.callback}')
+        finally:
+            self.task = None
+
+    async def flush(self):
+        """ Run the requested call now and wait for any call in progress to finish. """
+        async with self.lock:
+            if self.pending:
+                self.pending = False
+                await self.callback()
+
+    def cancel(self):
+        """ Drop the requested call. """
+        self.pending = False
+
+    def close(self):
+        """ Drop the requested call and stop the waiting task. """
+        self.cancel()
+
+        if self.task is not None:
+            self.task.cancel()
+
+
+class MemberCache:
+    """ Least recently used members the bot touched, for when the guild member cache doesn't hold every member. """
+
+    def __init__(self, size=MEMBER_CACHE_SIZE, low_memory=False):
+        """ Set attributes, the cache is only used when the guild member cache is restricted in low memory mode. """
+        self.size = size
+        self.low_memory = low_memory
+        self.members = OrderedDict()
+
+    def _add(self, member):
+        """"""
+        key = (member.guild.id, member.id)
+        self.members[key] = member
+        self.members.move_to_end(key)
+
+        if len(self.members) > self.size:
+            self.members.popitem(last=False)
+
+    def remove(self, member):
+        """ Forget a member who left their guild. """
+        self.members.pop((member.guild.id, member.id), None)
+
+    async def get_members(self, guild, user_ids):
+        """ Get the members of a guild in the order of their ids, None for the users not in the guild.
+
+        In low memory mode, members missing from both caches are requested through the gateway, up to 100 per request.
+        Otherwise the guild member cache holds every member and the users missing from it have left the guild.
+        """
+        if not self.low_memory:
+            return [guild.get_member(user_id) for user_id in user_ids]
+
+        found = {}
+        missing = []
+
+        for user_id in user_ids:
+            member = guild.get_member(user_id) or self.members.get((guild.id, user_id))
+
+            if member is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = member
+                self._add(member)
+
+        for i in range(0, len(missing), MEMBER_QUERY_LIMIT):
+            chunk = missing[i:i + MEMBER_QUERY_LIMIT]
+
+            try:
+                members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            except asyncio.TimeoutError:  # Treat the users the gateway didn't answer for as missing
+                continue
+
+            for member in members:
+                found[member.id] = member
+                self._add(member)
+
+        return [found.get(user_id) for user_id in user_ids]
+
+
 class Map:
     """ A group of attributes representing a map. """
 
@@ -103,31 +328,97 @@ class Map:
         self.image_url = image_url
 
 
-async def create_emojis(bot, guild):
-    """ Upload custom map emojis to guilds. """
-    url_path = 'https://raw.githubusercontent.com/thboss/CSGO-PUGs-Bot/develop/assets/maps/icons/'
-    icons_dic = 'assets/maps/icons/'
-    icons = os.listdir(icons_dic)
-    try:
-        guild_emojis = [e.name for e in guild.emojis]
-    except IndexError:
+class MapManifest:
+    """ The map assets listed in the manifest generated by make_manifest.py. """
+
+    def __init__(self, maps, digest):
+        """ Set attributes. """
+        self.maps = maps
+        self.digest = digest
+
+    @classmethod
+    def load(cls, path=MAPS_MANIFEST):
+        """ Read the manifest and fingerprint its content. """
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        return cls(json.loads(data), hashlib.sha256(data).hexdigest())
+
+
+def _read_icon(asset):
+    """"""
+    with open(os.path.join(ASSETS_DIR, 'maps', 'icons', asset['file']), 'rb') as f:
+        return f.read()
+
+
+async def sync_emojis(bot, guild):
+    """ Upload the missing map emojis and replace the ones whose icon changed, then index the maps having an emoji.
+
+    Nothing is done unless the manifest or the emoji guild changed since the last complete sync.
+    """
+    sync_key = (guild.id, bot.map_manifest.digest)
+    if bot.emojis_synced == sync_key:
         return
 
-    for icon in icons:
-        if icon.endswith('.png') and '-' in icon and os.stat(icons_dic + icon).st_size < 256000:
-            emoji_name = icon.split('-')[0]
-            emoji_dev = icon.split('-')[1].split('.')[0]
-            if emoji_dev in guild_emojis:
-                emoji = get(guild.emojis, name=emoji_dev)
-                bot.all_maps[emoji_dev] = Map(
-                    emoji_name,
-                    emoji_dev,
-                    f'<:{emoji_dev}:{emoji.id}>',
-                    f'{url_path}{icon.replace(" ", "%20")}'
-                )
-            else:
-                with open(icons_dic + icon, 'rb') as image:
-                    emoji = await guild.create_custom_emoji(name=emoji_dev, image=image.read())
+    guild_emojis = {emoji.name: emoji for emoji in guild.emojis}
+    assets = {asset['dev_name']: asset for asset in bot.map_manifest.maps}
+    map_emojis = [emoji for name, emoji in guild_emojis.items() if name in assets]
+    synced = await bot.db.get_map_emojis(*(emoji.id for emoji in map_emojis))
+    # Emojis uploaded before their icon hash was saved are taken as up to date
+    untracked = {emoji.id: assets[emoji.name]['hash'] for emoji in map_emojis if emoji.id not in synced}
+
+    if untracked:
+        await bot.db.insert_map_emojis(untracked)
+        synced.update(untracked)
+
+    outdated = [asset for asset in bot.map_manifest.maps
+                if asset['dev_name'] not in guild_emojis or synced[guild_emojis[asset['dev_name']].id] != asset['hash']]
+    replaced = []
+    semaphore = asyncio.Semaphore(EMOJI_UPLOAD_CONCURRENCY)
+
+    async def upload(asset):
+        async with semaphore:
+            image = await bot.loop.run_in_executor(None, _read_icon, asset)
+            old_emoji = guild_emojis.get(asset['dev_name'])
+
+            # The old emoji goes first so a guild at its emoji limit still has room for the new one
+            if old_emoji is not None:
+                await old_emoji.delete()
+                del guild_emojis[asset['dev_name']]
+                replaced.append(old_emoji.id)
+
+            return await guild.create_custom_emoji(name=asset['dev_name'], image=image)
+
+    results = await asyncio.gather(*(upload(asset) for asset in outdated), return_exceptions=True)
+    uploaded = {}
+    failed = False
+
+    for asset, result in zip(outdated, results):
+        if isinstance(result, Exception):
+            bot.logger.error(f'Unable to upload emoji of map {asset["dev_name"]}: {result}')
+            failed = True
+        else:
+            guild_emojis[asset['dev_name']] = result
+            uploaded[result.id] = asset['hash']
+
+    if replaced:
+        await bot.db.delete_map_emojis(*replaced)
+
+    if uploaded:
+        await bot.db.insert_map_emojis(uploaded)
+
+    bot.all_maps = {
+        asset['dev_name']: Map(
+            asset['name'],
+            asset['dev_name'],
+            f'<:{asset["dev_name"]}:{guild_emojis[asset["dev_name"]].id}>',
+            asset['image_url']
+        )
+        for asset in bot.map_manifest.maps if asset['dev_name'] in guild_emojis
+    }
+
+    if not failed:
+        bot.emojis_synced = sync_key
 
 
 async def check_setup(bot, ctx):
@@ -157,11 +448,12 @@ async def check_pug(bot, ctx, queue_id):
 
 class GuildData:
     """"""
-    def __init__(self, guild, auth, linked_role, prematch_channel):
+    def __init__(self, guild, auth, linked_role, prematch_channel, language):
         self.guild = guild
         self.auth = auth
         self.linked_role = linked_role
         self.prematch_channel = prematch_channel
+        self.language = language
 
     @classmethod
     def from_dict(cls, bot, guild_data: dict):
@@ -176,7 +468,8 @@ class GuildData:
             guild,
             auth,
             guild.get_role(guild_data['linked_role']),
-            guild.get_channel(guild_data['prematch_channel'])
+            guild.get_channel(guild_data['prematch_channel']),
+            guild_data['language']
         )
 
 
@@ -201,7 +494,9 @@ class PUGData:
         guild = bot.get_guild(pug_data['guild'])
         queue_channel = guild.get_channel(pug_data['queue_channel'])
         lobby_channel = guild.get_channel(pug_data['lobby_channel'])
-        last_message = queue_channel.get_partial_message(pug_data['last_message'])
+        last_message = None
+        if pug_data['last_message'] is not None:
+            last_message = queue_channel.get_partial_message(pug_data['last_message'])
 
         return cls(
             pug_data['id'],
@@ -220,7 +515,7 @@ class PUGData:
 class MatchData:
     """"""
     def __init__(self, id, guild_data, pug_data, message, category, team1_channel,
-                 team2_channel, team1_name, team2_name, players):
+                 team2_channel, team1_name, team2_name, player_ids):
         self.id = id
         self.guild_data = guild_data
         self.pug_data = pug_data
@@ -230,20 +525,26 @@ class MatchData:
         self.team2_channel = team2_channel
         self.team1_name = team1_name
         self.team2_name = team2_name
-        self.players = players
+        self.player_ids = player_ids
 
     @classmethod
     async def from_dict(cls, bot, match_data: dict):
         """"""
         guild_data = await get_guild_data(bot, match_data['guild'])
         pug_data = await get_pug_data(bot, match_data['pug'])
-        guild = guild_data.guild
         players = await bot.db.get_match_users(match_data['id'])
         try:
             message = await pug_data.queue_channel.fetch_message(match_data['message'])
         except (NotFound, HTTPException):
             message = None
 
+        return cls.from_rows(match_data, guild_data, pug_data, players, message)
+
+    @classmethod
+    def from_rows(cls, match_data: dict, guild_data, pug_data, player_ids, message):
+        """ Build the match from already loaded data. """
+        guild = guild_data.guild
+
         return cls(
             match_data['id'],
             guild_data,
@@ -254,7 +555,7 @@ class MatchData:
             guild.get_channel(match_data['team2_channel']),
             match_data['team1_name'],
             match_data['team2_name'],
-            [guild.get_member(user_id) for user_id in players]
+            player_ids
         )
 
 
@@ -266,10 +567,10 @@ class UserData:
         self.flag = flag
 
     @classmethod
-    def from_dict(cls, user_data: dict, guild):
+    def from_dict(cls, user_data: dict, member):
         """"""
         return cls(
-            guild.get_member(user_data['discord_id']),
+            member,
             user_data['steam_id'],
             user_data['flag']
         )
@@ -308,4 +609,46 @@ async def get_user_data(bot, guild, row_id, column='discord_id'):
         user_data = await bot.db.get_user(row_id, column)
     except AttributeError:
         return
-    return UserData.from_dict(user_data, guild)
+    member, = await bot.member_cache.get_members(guild, [user_data['discord_id']])
+    return UserData.from_dict(user_data, member)
+
+
+async def get_player_stats(bot, user_data):
+    """"""
+    row = (await bot.db.get_players_stats(user_data.steam)).get(user_data.steam)
+    return PlayerStats(user_data.steam, user_data.discord.id, row, bot.web_url)
+
+
+async def get_players_stats(bot, users):
+    """ Get the stats of the linked users in the order of the users. """
+    users_data = await bot.db.get_users([user.id for user in users])
+    if not users_data:
+        return
+    steam_ids = {data[0]: data[1] for data in users_data}
+    rows = await bot.db.get_players_stats(*steam_ids.values())
+
+    linked_ids = [user.id for user in users if user.id in steam_ids]
+
+    return PlayerStatsBatch([steam_ids[user_id] for user_id in linked_ids], linked_ids,
+                            [rows.get(steam_ids[user_id]) for user_id in linked_ids], bot.web_url)
+
+
+async def rank_users_by_form(bot, users):
+    """ Get the users with their form rating from the best to the worst, unlinked users last with a rating of 0. """
+    players_stats = await get_players_stats(bot, users) or []
+    members = {user.id: user for user in users}
+    ranked = [players_stats[index] for index in players_stats.ranking(form=True)] if players_stats else []
+    linked_ids = {stats.discord for stats in ranked}
+
+    return [(members[stats.discord], stats.form_rating) for stats in ranked] + \
+           [(user, 0) for user in users if user.id not in linked_ids]
+
+
+async def get_guild_leaders(bot, guild, page, per_page):
+    """ Get the ranks and stats of the players on a page of the guild leaderboard and the number of pages. """
+    first_rank = (page - 1) * per_page + 1
+    rows, total = await bot.db.get_guild_leaderboard(guild.id, first_rank, first_rank + per_page - 1)
+    leaders = [(row['rank'], PlayerStats(row['steam_id'], row['discord_id'], row, bot.web_url))
+               for row in rows]
+
+    return leaders, math.ceil(total / per_page)
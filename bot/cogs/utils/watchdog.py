@@ -0,0 +1,99 @@
+# watchdog.py
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from . import metrics
+
+
+HEARTBEAT_INTERVAL = 0.25
+LAG_SAMPLES = 1200  # Five minutes of heartbeats
+LAG_QUANTILES = (0.5, 0.9, 0.99, 1.0)
+
+
+class LoopWatchdog:
+    """ Measures the event loop lag with a heartbeat task and reports what blocks the loop for too long.
+
+    A monitor thread checks the heartbeat, and when it is late by more than the threshold it logs the stack of the
+    loop's thread, which is the code that is blocking the loop, along with the task that is running.
+    """
+
+    def __init__(self, loop, threshold=None):
+        """ Set attributes, the monitor thread only runs if a threshold is set. """
+        self.loop = loop
+        self.threshold = threshold
+        self.lags = deque(maxlen=LAG_SAMPLES)
+        self.last_beat = None
+        self.loop_thread_id = None
+        self.heartbeat_task = None
+        self.monitor_thread = None
+        self.stopped = threading.Event()
+        self.logger = logging.getLogger('PUGs.watchdog')
+        metrics.LOOP_LAG_QUANTILES.set_function(
+            lambda: {(str(quantile),): lag for quantile, lag in self.percentiles().items()})
+
+    def percentiles(self):
+        """ Get the recent lag percentiles, in seconds, indexed by quantile. """
+        lags = sorted(self.lags)
+
+        if not lags:
+            return {}
+
+        return {quantile: lags[min(int(quantile * len(lags)), len(lags) - 1)] for quantile in LAG_QUANTILES}
+
+    async def _heartbeat(self):
+        """ Record how late the loop wakes up the heartbeat. """
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            now = time.monotonic()
+            lag = max(now - self.last_beat - HEARTBEAT_INTERVAL, 0.0)
+            self.last_beat = now
+            self.lags.append(lag)
+            metrics.LOOP_LAG_SECONDS.observe(lag)
+
+            if self.threshold is not None and lag > self.threshold:
+                metrics.LOOP_STALLS.inc()
+                self.logger.warning(f'Event loop was blocked for {lag:.3f}s')
+
+    def _monitor(self):
+        """ Log the stack of the loop's thread once per stall longer than the threshold. """
+        reported_beat = None
+
+        while not self.stopped.wait(self.threshold / 2):
+            last_beat = self.last_beat
+
+            if last_beat is None or last_beat == reported_beat:
+                continue
+
+            blocked = time.monotonic() - last_beat - HEARTBEAT_INTERVAL
+
+            if blocked > self.threshold:
+                reported_beat = last_beat
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = ''.join(traceback.format_stack(frame)) if frame is not None else 'Unknown\n'
+                task = asyncio.current_task(self.loop)
+                self.logger.warning(f'Event loop has been blocked for {blocked:.3f}s in task {task!r}:\n\n{stack}')
+
+    def start(self):
+        """"""
+        self.heartbeat_task = self.loop.create_task(self._heartbeat())
+
+        if self.threshold is not None:
+            self.logger.info(f'Watching for event loop stalls longer than {self.threshold}s')
+            self.monitor_thread = threading.Thread(target=self._monitor, name='LoopWatchdog', daemon=True)
+            self.monitor_thread.start()
+
+    def stop(self):
+        """"""
+        self.stopped.set()
+
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
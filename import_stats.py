@@ -0,0 +1,60 @@
+# import_stats.py
+
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+import os
+
+from bot.cogs.utils.api import ApiHelper, stats_rows
+from bot.cogs.utils.db import DBHelper
+
+
+def parse_time(timestamp):
+    """ Parse a G5API timestamp. """
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+async def import_guild_stats(db, api, guild_id, auth):
+    """ Save the stats of the finished matches of a guild's G5API user from the oldest to the newest. """
+    matches = [match for match in await api.my_matches(auth)
+               if match['end_time'] and not match['cancelled'] and match['winner'] is not None]
+    matches.sort(key=lambda match: parse_time(match['end_time']))
+    imported = 0
+
+    for match in matches:
+        scoreboard = await api.get_match_scoreboard(match['id'])
+
+        if not scoreboard:
+            continue
+
+        players = scoreboard['team1_players'] + scoreboard['team2_players']
+        rows = stats_rows(match['id'], match['winner'], players, parse_time(match['end_time']))
+
+        if await db.insert_match_stats(guild_id, rows):
+            imported += 1
+
+    print(f'Imported {imported} of the {len(matches)} finished matches of guild {guild_id}')
+
+
+async def import_stats(db, api):
+    """ Save the stats of the matches every guild finished on G5API, the matches already saved are skipped. """
+    for guild_id, auth in (await db.get_guilds_auth()).items():
+        try:
+            await import_guild_stats(db, api, guild_id, auth)
+        except Exception as e:
+            print(f'Unable to import the matches of guild {guild_id}: {e!r}')
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    connect_url = 'postgresql://{POSTGRESQL_USER}:{POSTGRESQL_PASSWORD}@{POSTGRESQL_HOST}/{POSTGRESQL_DB}'
+    api_url = os.environ['G5API_URL'].rstrip('/')
+    loop = asyncio.get_event_loop()
+    db = DBHelper(connect_url.format(**os.environ))
+    api = ApiHelper(None, loop, api_url)
+
+    try:
+        loop.run_until_complete(import_stats(db, api))
+    finally:
+        loop.run_until_complete(api.close())
+        loop.run_until_complete(db.close())
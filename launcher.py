@@ -27,8 +27,14 @@ def run_bot():
         league_url = os.environ['LEAGUE_URL']
     except KeyError:
         league_url = None
+
+    low_memory = os.environ.get('DISCORD_BOT_LOW_MEMORY', '').lower() in ('1', 'true', 'yes')
+    metrics_port = int(os.environ['DISCORD_BOT_METRICS_PORT']) if os.environ.get('DISCORD_BOT_METRICS_PORT') else None
+    metrics_host = os.environ.get('DISCORD_BOT_METRICS_HOST') or '127.0.0.1'
+    watchdog_threshold = float(os.environ.get('DISCORD_BOT_LOOP_WATCHDOG') or 0) or None
     # Instantiate bot and run
-    bot = PUGsBot(bot_prefixes, bot_token, api_url, db_connect_url, league_url)
+    bot = PUGsBot(bot_prefixes, bot_token, api_url, db_connect_url, league_url, low_memory, metrics_port, metrics_host,
+                  watchdog_threshold)
     bot.run()
 
 
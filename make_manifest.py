@@ -0,0 +1,49 @@
+# make_manifest.py
+
+import hashlib
+import json
+import os
+
+
+_CWD = os.path.dirname(os.path.abspath(__file__))
+ICONS_DIR = os.path.join(_CWD, 'assets', 'maps', 'icons')
+MANIFEST = os.path.join(_CWD, 'assets', 'maps', 'manifest.json')
+ICONS_URL = 'https://raw.githubusercontent.com/thboss/CSGO-PUGs-Bot/develop/assets/maps/icons/'
+MAX_EMOJI_SIZE = 256000
+
+
+def build_manifest():
+    """ List the map icons that can be uploaded as emojis, named "<Map name>-<dev_name>.png". """
+    maps = []
+
+    for icon in sorted(os.listdir(ICONS_DIR)):
+        if not icon.endswith('.png') or '-' not in icon:
+            continue
+
+        with open(os.path.join(ICONS_DIR, icon), 'rb') as f:
+            image = f.read()
+
+        if len(image) >= MAX_EMOJI_SIZE:
+            continue
+
+        name, dev_name = icon[:-len('.png')].split('-', 1)
+        maps.append({
+            'name': name,
+            'dev_name': dev_name,
+            'file': icon,
+            'size': len(image),
+            'hash': hashlib.sha256(image).hexdigest(),
+            'image_url': ICONS_URL + icon.replace(' ', '%20')
+        })
+
+    return maps
+
+
+if __name__ == '__main__':
+    maps = build_manifest()
+
+    with open(MANIFEST, 'w', encoding='utf8') as f:
+        json.dump(maps, f, indent=4)
+        f.write('\n')
+
+    print(f'Wrote {len(maps)} maps to {MANIFEST}')
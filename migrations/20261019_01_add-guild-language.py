@@ -0,0 +1,19 @@
+# 20261019_01_add-guild-language.py
+
+from yoyo import step
+
+__depends__ = {'20200513_01_kPWNp-create-base-tables'}
+
+
+steps = [
+    step(
+        (
+            'ALTER TABLE guilds\n'
+            'ADD COLUMN language VARCHAR(8) DEFAULT NULL;'
+        ),
+        (
+            'ALTER TABLE guilds\n'
+            'DROP COLUMN language;'
+        )
+    )
+]
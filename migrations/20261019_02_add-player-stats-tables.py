@@ -0,0 +1,73 @@
+# 20261019_02_add-player-stats-tables.py
+
+from yoyo import step
+
+__depends__ = {'20200513_01_kPWNp-create-base-tables'}
+
+
+steps = [
+    step(
+        (
+            'CREATE TABLE match_player_stats(\n'
+            '    match_id INTEGER NOT NULL,\n'
+            '    map_id INTEGER NOT NULL,\n'
+            '    steam_id VARCHAR(18) NOT NULL,\n'
+            '    name VARCHAR(64) DEFAULT NULL,\n'
+            '    kills INTEGER NOT NULL DEFAULT 0,\n'
+            '    deaths INTEGER NOT NULL DEFAULT 0,\n'
+            '    assists INTEGER NOT NULL DEFAULT 0,\n'
+            '    k1 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k2 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k3 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k4 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k5 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v1 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v2 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v3 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v4 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v5 INTEGER NOT NULL DEFAULT 0,\n'
+            '    rounds INTEGER NOT NULL DEFAULT 0,\n'
+            '    flashbang_assists INTEGER NOT NULL DEFAULT 0,\n'
+            '    damage INTEGER NOT NULL DEFAULT 0,\n'
+            '    headshot_kills INTEGER NOT NULL DEFAULT 0,\n'
+            '    won BOOL NOT NULL DEFAULT false,\n'
+            '    rating REAL NOT NULL DEFAULT 0,\n'
+            '    finished_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,\n'
+            '    CONSTRAINT match_player_stats_pkey PRIMARY KEY (match_id, map_id, steam_id)\n'
+            ');'
+        ),
+        'DROP TABLE match_player_stats;'
+    ),
+    step(
+        'CREATE INDEX match_player_stats_steam_id_idx ON match_player_stats (steam_id, finished_at);',
+        'DROP INDEX match_player_stats_steam_id_idx;'
+    ),
+    step(
+        (
+            'CREATE TABLE player_stats(\n'
+            '    steam_id VARCHAR(18) PRIMARY KEY,\n'
+            '    name VARCHAR(64) DEFAULT NULL,\n'
+            '    kills INTEGER NOT NULL DEFAULT 0,\n'
+            '    deaths INTEGER NOT NULL DEFAULT 0,\n'
+            '    assists INTEGER NOT NULL DEFAULT 0,\n'
+            '    k1 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k2 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k3 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k4 INTEGER NOT NULL DEFAULT 0,\n'
+            '    k5 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v1 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v2 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v3 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v4 INTEGER NOT NULL DEFAULT 0,\n'
+            '    v5 INTEGER NOT NULL DEFAULT 0,\n'
+            '    rounds INTEGER NOT NULL DEFAULT 0,\n'
+            '    flashbang_assists INTEGER NOT NULL DEFAULT 0,\n'
+            '    damage INTEGER NOT NULL DEFAULT 0,\n'
+            '    headshot_kills INTEGER NOT NULL DEFAULT 0,\n'
+            '    wins INTEGER NOT NULL DEFAULT 0,\n'
+            '    total_maps INTEGER NOT NULL DEFAULT 0\n'
+            ');'
+        ),
+        'DROP TABLE player_stats;'
+    )
+]
@@ -0,0 +1,39 @@
+# 20261019_03_add-guild-leaderboard.py
+
+from yoyo import step
+
+__depends__ = {'20261019_02_add-player-stats-tables'}
+
+
+steps = [
+    step(
+        (
+            'CREATE TABLE guild_players(\n'
+            '    guild_id BIGINT REFERENCES guilds (id) ON DELETE CASCADE,\n'
+            '    steam_id VARCHAR(18) NOT NULL,\n'
+            '    CONSTRAINT guild_players_pkey PRIMARY KEY (guild_id, steam_id)\n'
+            ');'
+        ),
+        'DROP TABLE guild_players;'
+    ),
+    step(
+        'CREATE INDEX guild_players_steam_id_idx ON guild_players (steam_id);',
+        'DROP INDEX guild_players_steam_id_idx;'
+    ),
+    step(
+        (
+            'CREATE TABLE guild_leaderboard(\n'
+            '    guild_id BIGINT REFERENCES guilds (id) ON DELETE CASCADE,\n'
+            '    rank INTEGER NOT NULL,\n'
+            '    steam_id VARCHAR(18) NOT NULL,\n'
+            '    rating REAL NOT NULL DEFAULT 0,\n'
+            '    CONSTRAINT guild_leaderboard_pkey PRIMARY KEY (guild_id, rank)\n'
+            ');'
+        ),
+        'DROP TABLE guild_leaderboard;'
+    ),
+    step(
+        'CREATE INDEX users_steam_id_idx ON users (steam_id);',
+        'DROP INDEX users_steam_id_idx;'
+    )
+]
@@ -0,0 +1,37 @@
+# 20261019_04_add-player-form-table.py
+
+from yoyo import step
+
+__depends__ = {'20261019_03_add-guild-leaderboard'}
+
+
+steps = [
+    step(
+        (
+            'CREATE TABLE player_form(\n'
+            '    steam_id VARCHAR(18) PRIMARY KEY,\n'
+            '    ratings REAL[] NOT NULL DEFAULT \'{}\',\n'
+            '    form REAL NOT NULL DEFAULT 0\n'
+            ');'
+        ),
+        'DROP TABLE player_form;'
+    ),
+    step(
+        # Backfill with the same window (20 maps) and decay weight (0.2) as DBHelper.insert_match_stats
+        (
+            'INSERT INTO player_form (steam_id, ratings, form)\n'
+            '    (SELECT steam_id,\n'
+            '        ARRAY_AGG(rating ORDER BY age DESC) FILTER (WHERE age < 20),\n'
+            '        SUM(rating * CASE WHEN age = maps - 1 THEN POWER(0.8, age) ELSE 0.2 * POWER(0.8, age) END)\n'
+            '        FROM (\n'
+            '            SELECT steam_id, rating,\n'
+            '                ROW_NUMBER() OVER (PARTITION BY steam_id\n'
+            '                    ORDER BY finished_at DESC, match_id DESC, map_id DESC) - 1 AS age,\n'
+            '                COUNT(*) OVER (PARTITION BY steam_id) AS maps\n'
+            '                FROM match_player_stats\n'
+            '        ) AS history\n'
+            '        GROUP BY steam_id);'
+        ),
+        'DELETE FROM player_form;'
+    )
+]
@@ -0,0 +1,18 @@
+# 20261019_05_add-map-emojis-table.py
+
+from yoyo import step
+
+__depends__ = {'20261019_04_add-player-form-table'}
+
+
+steps = [
+    step(
+        (
+            'CREATE TABLE map_emojis(\n'
+            '    emoji_id BIGINT PRIMARY KEY,\n'
+            '    hash CHAR(64) NOT NULL\n'
+            ');'
+        ),
+        'DROP TABLE map_emojis;'
+    )
+]
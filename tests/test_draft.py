@@ -0,0 +1,75 @@
+# test_draft.py
+
+import random
+import unittest
+
+from bot.cogs.utils.draft import DraftEngine
+
+DRAFTS = 500
+
+
+def random_draft(rng, players, volunteer):
+    """ Run a draft where captains pick at random and random players try to pick out of turn. """
+    engine = DraftEngine(players)
+
+    if not volunteer:
+        for team, captain in enumerate(rng.sample(players, 2)):
+            engine.set_captain(team, captain)
+
+    # Every allowed pick drafts a player, the cap only stops a draft that got stuck
+    for _ in range(len(players) * 10):
+        if engine.done:
+            break
+
+        picker = engine.active_picker
+
+        if picker is None or rng.random() < 0.2:
+            picker = rng.choice(players)
+
+        engine.pick(picker, engine.players[rng.choice(sorted(engine.remaining))])
+
+    return engine
+
+
+class DraftEngineTest(unittest.TestCase):
+    """"""
+
+    def assertValidDraft(self, engine):
+        """ Check a draft finished with balanced teams that split the players and can be replayed. """
+        team_1, team_2 = engine.teams
+        self.assertTrue(engine.done)
+        self.assertCountEqual(team_1 + team_2, engine.players)
+        self.assertLessEqual(abs(len(team_1) - len(team_2)), 1)
+        self.assertEqual(DraftEngine.replay(engine.players, engine.events).teams, engine.teams)
+
+    def test_random_drafts(self):
+        """"""
+        rng = random.Random(0)
+
+        for draft in range(DRAFTS):
+            players = list(range(rng.randint(2, 100)))
+            volunteer = draft % 2 == 0
+
+            with self.subTest(players=len(players), volunteer=volunteer):
+                self.assertValidDraft(random_draft(rng, players, volunteer))
+
+    def test_two_player_volunteer_draft(self):
+        """"""
+        engine = DraftEngine(['a', 'b'])
+        self.assertTrue(engine.pick('a', 'b'))
+        self.assertEqual(engine.teams, (['a'], ['b']))
+        self.assertValidDraft(engine)
+
+    def test_out_of_turn_pick(self):
+        """"""
+        engine = DraftEngine(['a', 'b', 'c', 'd'])
+        engine.set_captain(0, 'a')
+        engine.set_captain(1, 'b')
+        self.assertFalse(engine.pick('b', 'c'))
+        self.assertTrue(engine.pick('a', 'c'))
+        self.assertEqual(engine.teams, (['a', 'c'], ['b', 'd']))
+        self.assertValidDraft(engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+# test_lobby.py
+
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from bot.cogs.lobby import Lobby, LobbyCog
+
+
+class FakeDB:
+    """ Records the users deleted from the queues. """
+
+    def __init__(self):
+        """"""
+        self.deleted = []
+
+    async def delete_queued_users(self, pug_id, *user_ids):
+        """"""
+        self.deleted.extend(user_ids)
+        return list(user_ids)
+
+
+class FakeBot:
+    """ Just enough of the bot for a lobby worker to run. """
+
+    def __init__(self, loop):
+        """"""
+        self.loop = loop
+        self.logged = []
+        self.db = FakeDB()
+
+    async def use_guild_language(self, guild):
+        """"""
+        pass
+
+    def get_cog(self, name):
+        """"""
+        return SimpleNamespace(log_exception=lambda msg, error: self.logged.append(error))
+
+
+async def slow_event(lobby):
+    """"""
+    await asyncio.sleep(0.05)
+    return 'slow'
+
+
+async def failing_slow_event(lobby):
+    """"""
+    await asyncio.sleep(0.05)
+    raise ValueError('failed')
+
+
+async def fast_event(lobby):
+    """"""
+    return 'fast'
+
+
+class LobbyTest(unittest.TestCase):
+    """"""
+
+    def setUp(self):
+        """"""
+        self.loop = asyncio.new_event_loop()
+        self.bot = FakeBot(self.loop)
+
+    def tearDown(self):
+        """"""
+        self.loop.close()
+
+    def _run_after_cancelled_call(self, event):
+        """ Stop waiting for an event's result and get the result of the event submitted after it. """
+        async def scenario():
+            lobby = Lobby(self.bot, SimpleNamespace(id=1, guild=None), [])
+
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(lobby.call(event), 0.01)
+
+                return await asyncio.wait_for(lobby.call(fast_event), 1)
+            finally:
+                lobby.close()
+
+        return self.loop.run_until_complete(scenario())
+
+    def test_cancelled_call_keeps_worker_running(self):
+        """"""
+        self.assertEqual(self._run_after_cancelled_call(slow_event), 'fast')
+
+    def test_cancelled_failing_call_keeps_worker_running(self):
+        """"""
+        self.assertEqual(self._run_after_cancelled_call(failing_slow_event), 'fast')
+        self.assertEqual(len(self.bot.logged), 1)
+
+    def test_remove_queued_updates_memory_and_database(self):
+        """"""
+        async def scenario():
+            lobby = Lobby(self.bot, SimpleNamespace(id=1, guild=None), [1, 2, 3])
+            lobby.render.close()
+            lobby.log = lambda title, footer=None: None
+            users = [SimpleNamespace(id=user_id, display_name=str(user_id)) for user_id in (2, 4)]
+
+            try:
+                await lobby.call(LobbyCog(self.bot).remove_queued, users)
+                return lobby.queued_ids
+            finally:
+                lobby.close()
+
+        self.assertEqual(self.loop.run_until_complete(scenario()), [1, 3])
+        self.assertEqual(self.bot.db.deleted, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# test_menu_memory.py
+
+import asyncio
+import gc
+import tracemalloc
+import unittest
+from types import SimpleNamespace
+
+import discord
+
+from bot.cogs.message import ReadyMessage
+
+MENUS = 1000
+USER = {'id': 1, 'username': 'user', 'discriminator': '0001', 'avatar': None}
+
+
+class FakeState:
+    """ Just enough of the connection state to build messages. """
+
+    def __init__(self):
+        """"""
+        self.http = None
+        self.user = None
+
+    def store_user(self, data):
+        """"""
+        return discord.User(state=self, data=data)
+
+    def _get_guild(self, guild_id):
+        """"""
+        return None
+
+
+class CopiedReadyMessage(discord.Message):
+    """ The ready menu as it was built before the Menu wrapper, copying every slot of its message. """
+
+    def __init__(self, message, bot, users, guild_data):
+        """"""
+        for attr_name in message.__slots__:
+            try:
+                attr_val = getattr(message, attr_name)
+            except AttributeError:
+                continue
+
+            setattr(self, attr_name, attr_val)
+
+        self.bot = bot
+        self.users = users
+        self.guild_data = guild_data
+        self.reactors = None
+        self.future = None
+
+
+def make_messages(count):
+    """ Build messages sent in a channel the way the gateway hands them to the bot. """
+    state = FakeState()
+    channel = discord.DMChannel(me=None, state=state, data={'id': 1, 'recipients': [USER]})
+    data = {'type': 0, 'content': '', 'author': USER, 'attachments': [], 'embeds': [], 'pinned': False,
+            'mention_everyone': False, 'tts': False, 'edited_timestamp': None, 'mentions': [], 'mention_roles': []}
+    return [discord.Message(state=state, channel=channel, data=dict(data, id=message_id))
+            for message_id in range(1, count + 1)]
+
+
+def measure_menus(menu_cls, bot, messages):
+    """ Get the bytes still allocated after building a menu on each message. """
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        menus = [menu_cls(message, bot, [], None) for message in messages]
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del menus
+    return size
+
+
+class MenuMemoryTest(unittest.TestCase):
+    """"""
+
+    def setUp(self):
+        """"""
+        self.loop = asyncio.new_event_loop()
+        self.bot = SimpleNamespace(loop=self.loop)
+        self.messages = make_messages(MENUS)
+
+    def tearDown(self):
+        """"""
+        self.loop.close()
+
+    def test_menus_use_less_memory_than_copied_messages(self):
+        """"""
+        copied = measure_menus(CopiedReadyMessage, self.bot, self.messages)
+        wrapped = measure_menus(ReadyMessage, self.bot, self.messages)
+        self.assertLess(wrapped, copied, f'{MENUS} menus: {wrapped / 1000:.0f} KB, copies: {copied / 1000:.0f} KB')
+
+
+if __name__ == '__main__':
+    loop = asyncio.new_event_loop()
+    bot = SimpleNamespace(loop=loop)
+    messages = make_messages(MENUS)
+    print(f'{MENUS} copied messages: {measure_menus(CopiedReadyMessage, bot, messages) / 1000:.0f} KB')
+    print(f'{MENUS} menus: {measure_menus(ReadyMessage, bot, messages) / 1000:.0f} KB')
+    loop.close()
@@ -0,0 +1,98 @@
+# test_translate.py
+
+import json
+import os
+import timeit
+import unittest
+
+from bot.cogs.utils.utils import TRANSLATIONS_DIR, catalog, current_table, translate
+
+CALLS = 200000
+LANGUAGE = 'ru'
+
+
+def load_translations():
+    """ Read every language file into one dictionary, the way translations.json was read. """
+    translations = {}
+
+    for file in os.listdir(TRANSLATIONS_DIR):
+        if file.endswith('.json'):
+            with open(os.path.join(TRANSLATIONS_DIR, file), encoding='utf8') as f:
+                translations[file[:-5]] = json.load(f)
+
+    return translations
+
+
+translations = load_translations()
+
+
+def dict_translate(text, *args):
+    """ The translate function as it was before the catalog, looking the environment language up on every call. """
+    trans_text = ''
+    if args:
+        try:
+            trans_text = translations[os.environ['DISCORD_BOT_LANGUAGE']][text].format(*args)
+        except (KeyError, ValueError):
+            trans_text = translations['en'][text].format(*args)
+    else:
+        try:
+            trans_text = translations[os.environ['DISCORD_BOT_LANGUAGE']][text].replace('{}', '')
+        except (KeyError, ValueError):
+            trans_text = translations['en'][text].replace('{}', '')
+
+    return trans_text
+
+
+def sample_keys():
+    """ Get a plain text, a formatted text and a text only the fallback language has. """
+    fallback, translated = translations['en'], translations[LANGUAGE]
+    plain = next(key for key in translated if key in fallback and '{}' not in fallback[key])
+    formatted = next(key for key in translated if key in fallback and fallback[key].count('{}') == 2)
+    missing = next(key for key in fallback if key not in translated)
+    return {'plain text': (plain,), 'formatted text': (formatted, 'a', 'b'), 'English fallback': (missing,)}
+
+
+def time_calls(func, args, number=CALLS):
+    """ Get the best time of a call in nanoseconds. """
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=3)) / number * 1e9
+
+
+class TranslateTest(unittest.TestCase):
+    """"""
+
+    def setUp(self):
+        """"""
+        self.environ_language = os.environ.get('DISCORD_BOT_LANGUAGE')
+        os.environ['DISCORD_BOT_LANGUAGE'] = LANGUAGE
+        self.token = current_table.set(catalog.table(LANGUAGE))
+
+    def tearDown(self):
+        """"""
+        current_table.reset(self.token)
+
+        if self.environ_language is None:
+            del os.environ['DISCORD_BOT_LANGUAGE']
+        else:
+            os.environ['DISCORD_BOT_LANGUAGE'] = self.environ_language
+
+    def test_catalog_matches_dictionaries(self):
+        """"""
+        for key, text in translations['en'].items():
+            args = ['arg'] * text.count('{}')
+
+            with self.subTest(key=key):
+                self.assertEqual(translate(key), dict_translate(key))
+                self.assertEqual(translate(key, *args), dict_translate(key, *args))
+
+    def test_plain_text_is_faster(self):
+        """"""
+        key = sample_keys()['plain text']
+        self.assertLess(time_calls(translate, key, CALLS // 10), time_calls(dict_translate, key, CALLS // 10))
+
+
+if __name__ == '__main__':
+    os.environ['DISCORD_BOT_LANGUAGE'] = LANGUAGE
+    current_table.set(catalog.table(LANGUAGE))
+
+    for name, args in sample_keys().items():
+        print(f'{name}: {time_calls(dict_translate, args):.0f} -> {time_calls(translate, args):.0f} ns')